@@ -2,10 +2,19 @@
 # Simple CNC toolpath generator from SVG file with duplicate path removal
 # Requirements: pip install svgpathtools numpy
 
-from svgpathtools import svg2paths
+from collections import defaultdict
 import numpy as np
+import os
 import sys
 
+from sampling import PathSampler, sample_circle, sample_path
+from toolpath import (chain_paths, estimate_cut_time, fit_arcs, move_count,
+                      order_paths, rapid_distance)
+from gcode_writer import path_gcode, write_gcode
+from stage_cache import NO_CACHE, StageCache
+from toolpath_file import write_toolpaths
+from svg_reader import read_svg
+
 # -------------------------------
 # CONFIGURATION
 # -------------------------------
@@ -17,18 +26,19 @@ CUT_DEPTH = -2       # Cutting depth (mm)
 FEED_RATE = 500      # Cutting speed
 PLUNGE_RATE = 200    # Z axis speed
 TOLERANCE = 0.1      # Tolerance for detecting duplicate points (mm)
+CHORD_TOLERANCE = 0.05  # Max chord deviation when sampling curves (mm); None for fixed steps
+OPTIMIZE_ORDER = True   # Reorder paths to minimize rapid travel
+CHAIN_TOLERANCE = 0.1   # Join paths whose endpoints meet within this distance (mm); None to disable
+FIT_TOLERANCE = 0.02    # Max deviation for line simplification and G2/G3 arc fitting (mm); None to disable
+CACHE_DIR = ".kolam_cache"  # Reuse stage results across runs from this directory; None to disable
+WRITE_TOOLPATH_FILE = True  # Write a binary .ktp toolpath file beside the G-code for fast loading
 
 # -------------------------------
 # HELPER FUNCTIONS
 # -------------------------------
 def discretize_path(path, steps=100):
-    """Convert curves into discrete (x,y) points"""
-    points = []
-    for seg in path:
-        for t in [i/steps for i in range(steps+1)]:
-            point = seg.point(t)
-            points.append((point.real, point.imag))
-    return points
+    """Convert curves into an (N,2) array of discrete (x,y) points"""
+    return sample_path(path, steps=steps)
 
 def are_paths_duplicate(path1, path2, tolerance=TOLERANCE):
     """Check if two paths are duplicates based on point proximity"""
@@ -41,79 +51,194 @@ def are_paths_duplicate(path1, path2, tolerance=TOLERANCE):
     reverse_diff = np.max(np.abs(path1 - path2[::-1]))
     return min(forward_diff, reverse_diff) < tolerance
 
-def remove_duplicate_paths(paths, steps=80):
-    """Remove duplicate paths based on discretized points"""
-    discretized_paths = [discretize_path(path, steps=steps) for path in paths]
-    unique_paths = []
-    unique_indices = []
-    
-    for i, path in enumerate(discretized_paths):
-        if i in unique_indices:
+def _grid_cell(point, cell=TOLERANCE):
+    """Quantize an (x,y) point to its integer grid cell"""
+    return (int(np.floor(point[0] / cell)), int(np.floor(point[1] / cell)))
+
+def _neighbour_cells(cell):
+    """The 3x3 block of grid cells centred on cell"""
+    cx, cy = cell
+    return [(cx + dx, cy + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+def find_duplicate_paths(discretized_paths, tolerance=TOLERANCE):
+    """Return the indices of paths that duplicate an earlier kept path.
+
+    Paths are bucketed by point count and the grid cell of their first and
+    last point, so only paths whose endpoints already line up (forward or
+    reversed) are compared. Bounding box and centroid must also agree within
+    tolerance before the exact check in are_paths_duplicate runs.
+    """
+    arrays = [np.asarray(p, dtype=float).reshape(-1, 2) for p in discretized_paths]
+    starts = defaultdict(list)
+    ends = defaultdict(list)
+    signatures = np.zeros((len(arrays), 6))
+    for i, pts in enumerate(arrays):
+        if len(pts) == 0:
             continue
-        is_unique = True
-        for j, other_path in enumerate(discretized_paths[i+1:], start=i+1):
-            if j in unique_indices:
+        starts[(len(pts), _grid_cell(pts[0], tolerance))].append(i)
+        ends[(len(pts), _grid_cell(pts[-1], tolerance))].append(i)
+        signatures[i, :2] = pts.min(axis=0)
+        signatures[i, 2:4] = pts.max(axis=0)
+        signatures[i, 4:] = pts.mean(axis=0)
+
+    duplicates = set()
+    for i, pts in enumerate(arrays):
+        if i in duplicates or len(pts) == 0:
+            continue
+        candidates = set()
+        for cell in _neighbour_cells(_grid_cell(pts[0], tolerance)):
+            # forward match: same start; reverse match: their end is our start
+            candidates.update(starts.get((len(pts), cell), ()))
+            candidates.update(ends.get((len(pts), cell), ()))
+        for j in sorted(candidates):
+            if j <= i or j in duplicates:
+                continue
+            if np.any(np.abs(signatures[i] - signatures[j]) >= tolerance):
                 continue
-            if are_paths_duplicate(path, other_path):
-                unique_indices.append(j)
-                is_unique = False
-        if is_unique:
-            unique_paths.append(paths[i])
-    
-    return unique_paths
+            if are_paths_duplicate(pts, arrays[j], tolerance):
+                duplicates.add(j)
+    return duplicates
+
+def remove_duplicate_paths(paths, steps=80, sampler=None):
+    """Remove duplicate paths based on discretized points"""
+    if sampler is None:
+        sampler = PathSampler(steps=steps)
+    discretized_paths = [sampler.sample(path) for path in paths]
+    duplicates = find_duplicate_paths(discretized_paths)
+    return [path for i, path in enumerate(paths) if i not in duplicates]
 
 def generate_gcode(points, depth=CUT_DEPTH, feed=FEED_RATE):
     """Convert a list of points into G-code instructions"""
-    gcode = []
-    if not points:
-        return gcode
-
-    gcode.append(f"G0 Z{SAFE_HEIGHT}")  # lift tool
-    start = points[0]
-    gcode.append(f"G0 X{start[0]:.2f} Y{start[1]:.2f}")  # move to start
-    gcode.append(f"G1 Z{depth:.2f} F{PLUNGE_RATE}")      # plunge
-
-    for x, y in points[1:]:
-        gcode.append(f"G1 X{x:.2f} Y{y:.2f} F{feed}")    # cut move
-
-    gcode.append(f"G0 Z{SAFE_HEIGHT}")  # retract tool
-    return gcode
+    blocks = path_gcode(points, depth=depth, feed=feed,
+                        safe_height=SAFE_HEIGHT, plunge_rate=PLUNGE_RATE)
+    return "".join(blocks).splitlines()
 
 # -------------------------------
 # MAIN LOGIC
 # -------------------------------
-def svg_to_gcode(input_svg, output_gcode):
-    paths, attributes = svg2paths(input_svg)
-    
-    # Remove duplicate paths
-    unique_paths = remove_duplicate_paths(paths, steps=80)
-    print(f"Original paths: {len(paths)}, Unique paths: {len(unique_paths)}")
-
-    gcode = [
-        "G21 ; set units to mm",
-        "G90 ; absolute positioning",
-        "G17 ; XY plane"
-    ]
-
-    for path in unique_paths:
-        points = discretize_path(path, steps=80)
-        gcode += generate_gcode(points)
-
-    gcode.append("M05 ; stop spindle")
-    gcode.append("G0 X0 Y0 ; return to origin")
-    gcode.append("M30 ; program end")
-
-    with open(output_gcode, "w") as f:
-        f.write("\n".join(gcode))
-
-    print(f"G-code written to {output_gcode}")
+def toolpaths_to_gcode(toolpaths, output_gcode, chord_tolerance=CHORD_TOLERANCE,
+                       optimize_order=OPTIMIZE_ORDER, chain_tolerance=CHAIN_TOLERANCE,
+                       fit_tolerance=FIT_TOLERANCE, log=sys.stdout, cache=None, key=None,
+                       toolpath_file=WRITE_TOOLPATH_FILE):
+    """Chain, order and arc-fit (N,2) toolpaths, then write them as G-code.
+
+    With a stage_cache.StageCache, key is the cache key the toolpaths came
+    from; the fitted toolpaths are then looked up before being computed.
+    The program is always streamed from them, never held in memory.
+    toolpath_file also writes the binary .ktp the viewer opens without
+    parsing, packed from the same fitted toolpaths.
+    Returns the number of toolpaths and cut moves.
+    """
+    if cache is None or key is None:
+        cache = NO_CACHE
+
+    def fitted():
+        paths = toolpaths
+        if chain_tolerance is not None:
+            paths = chain_paths(paths, tolerance=chain_tolerance)
+            print(f"Chained paths: {len(toolpaths)} -> {len(paths)}", file=log)
+        if optimize_order:
+            before = rapid_distance(paths)
+            paths = order_paths(paths)
+            print(f"Rapid travel: {before:.1f} mm -> {rapid_distance(paths):.1f} mm", file=log)
+        if fit_tolerance is not None:
+            moves, seconds = sum(map(move_count, paths)), estimate_cut_time(paths, FEED_RATE)
+            paths = [fit_arcs(points, tolerance=fit_tolerance, chord_tolerance=chord_tolerance or 0.0)
+                     for points in paths]
+            print(f"Cut moves: {moves} -> {sum(map(move_count, paths))}, "
+                  f"est. cut time {seconds:.1f} s -> {estimate_cut_time(paths, FEED_RATE):.1f} s", file=log)
+        return paths
+
+    _, fitted_paths = cache.stage("toolpaths", (key, chord_tolerance, optimize_order,
+                                                chain_tolerance, fit_tolerance), fitted)
+    path_options = dict(depth=CUT_DEPTH, feed=FEED_RATE, safe_height=SAFE_HEIGHT, plunge_rate=PLUNGE_RATE)
+    write_gcode(fitted_paths, output_gcode, **path_options)
+    print(f"G-code written to {getattr(output_gcode, 'name', output_gcode)}", file=log)
+    if toolpath_file and isinstance(output_gcode, (str, os.PathLike)):
+        print(f"Toolpaths written to {write_toolpaths(output_gcode, fitted_paths, **path_options)}", file=log)
+    return {"toolpaths": len(fitted_paths), "moves": sum(map(move_count, fitted_paths))}
+
+def svg_to_gcode(input_svg, output_gcode, chord_tolerance=CHORD_TOLERANCE,
+                 optimize_order=OPTIMIZE_ORDER, chain_tolerance=CHAIN_TOLERANCE,
+                 fit_tolerance=FIT_TOLERANCE, cache=None, toolpath_file=WRITE_TOOLPATH_FILE):
+    """Convert an SVG to G-code, streamed to a file path or writable text stream.
+
+    cache is an optional stage_cache.StageCache keyed by the SVG's contents;
+    toolpath_file is passed to toolpaths_to_gcode().
+    Returns the path counts at each stage and the number of cut moves.
+    """
+    # Keep status messages out of the program when streaming it to stdout
+    log = sys.stderr if output_gcode is sys.stdout else sys.stdout
+    cache = cache or NO_CACHE
+
+    def sampled():
+        paths = read_svg(input_svg)
+
+        # Remove duplicate paths on fixed-step samples, whose point counts
+        # agree for matching curves. Emission reuses them only without a
+        # chord tolerance; otherwise curves are sampled a second time
+        # (svg_reader polylines return their vertices either way)
+        sampler = PathSampler(steps=80)
+        unique_paths = remove_duplicate_paths(paths, sampler=sampler)
+        print(f"Original paths: {len(paths)}, Unique paths: {len(unique_paths)}", file=log)
+        if chord_tolerance is not None:
+            sampler = PathSampler(chord_tolerance=chord_tolerance)
+        return {"paths": len(paths), "toolpaths": [sampler.sample(path) for path in unique_paths]}
+
+    key, sampled_paths = cache.stage("paths", (cache.file_key(input_svg), "svg-reader", TOLERANCE, chord_tolerance),
+                                     sampled)
+    toolpaths = sampled_paths["toolpaths"]
+    counts = toolpaths_to_gcode(toolpaths, output_gcode, chord_tolerance, optimize_order,
+                                chain_tolerance, fit_tolerance, log=log, cache=cache, key=key,
+                                toolpath_file=toolpath_file)
+    return dict({"paths": sampled_paths["paths"], "unique_paths": len(toolpaths)}, **counts)
+
+def png_to_gcode(image_path, output_gcode, svg_path=None, scale=1.0, min_stroke_width=1.0,
+                 chord_tolerance=CHORD_TOLERANCE, optimize_order=OPTIMIZE_ORDER,
+                 chain_tolerance=CHAIN_TOLERANCE, fit_tolerance=FIT_TOLERANCE, cache=None,
+                 toolpath_file=WRITE_TOOLPATH_FILE, **image_options):
+    """Convert a kolam scan straight to G-code, without an SVG round trip.
+
+    The stroke polylines of img.vectorize_kolam() become toolpaths as they
+    are, and the dots become circles; nothing is re-parsed, resampled or
+    deduplicated.
+    The SVG is still written to svg_path if one is given. image_options
+    (use_ai_segmentation, model_path, tile_size, ...) go to vectorize_kolam,
+    and every stage goes through cache if one is given; toolpath_file is
+    passed to toolpaths_to_gcode().
+    Returns the dot and stroke counts along with svg_to_gcode()'s.
+    """
+    from img import vectorize_kolam, write_kolam_svg   # needs torch
+
+    log = sys.stderr if output_gcode is sys.stdout else sys.stdout
+    cache = cache or NO_CACHE
+    kolam = vectorize_kolam(image_path, scale, min_stroke_width, cache=cache, **image_options)
+    if svg_path is not None:
+        write_kolam_svg(kolam, svg_path)
+        print(f"Enhanced SVG saved at {svg_path}", file=log)
+
+    # Strokes are skeleton graph edges, each walked once, so there are no
+    # duplicates to remove
+    def sampled():
+        paths = [sample_circle((x, y), radius, chord_tolerance) for x, y, radius in kolam["dots"]]
+        paths += kolam["strokes"]
+        print(f"Paths: {len(paths)}", file=log)
+        return {"paths": len(paths), "toolpaths": paths}
+
+    key, sampled_paths = cache.stage("paths", (kolam["key"], chord_tolerance), sampled)
+    toolpaths = sampled_paths["toolpaths"]
+    counts = toolpaths_to_gcode(toolpaths, output_gcode, chord_tolerance, optimize_order,
+                                chain_tolerance, fit_tolerance, log=log, cache=cache, key=key,
+                                toolpath_file=toolpath_file)
+    return dict({"dots": len(kolam["dots"]), "strokes": len(kolam["strokes"]),
+                 "paths": sampled_paths["paths"], "unique_paths": len(toolpaths)}, **counts)
 
 # -------------------------------
 # RUN SCRIPT
 # -------------------------------
 if __name__ == "__main__":
     try:
-        svg_to_gcode(INPUT_FILE, OUTPUT_FILE)
+        svg_to_gcode(INPUT_FILE, OUTPUT_FILE, cache=StageCache(CACHE_DIR) if CACHE_DIR else None)
     except Exception as e:
         print("Error:", e)
         sys.exit(1)
\ No newline at end of file
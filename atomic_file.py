@@ -0,0 +1,36 @@
+# atomic_file.py
+# Files that replace their target in one rename once fully written, so readers
+# (the viewer, a running sender, another process) see either the old file or
+# the new one, never a partial write
+# Requirements: none (standard library)
+
+import contextlib
+import os
+import tempfile
+
+# mkstemp creates files private to the user; replaced files get the
+# permissions open() would have given them instead
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+@contextlib.contextmanager
+def replacing(path, mode="w", buffering=-1):
+    """File object for mode ("w" or "wb") that replaces path when the block exits.
+
+    The temporary file is unique to this call and lives in path's directory,
+    so concurrent writers to the same target never share it and the rename
+    stays on one filesystem; the last writer wins. On any error the
+    temporary file is removed and path is left as it was.
+    """
+    path = os.fspath(path)
+    directory, name = os.path.split(path)
+    fd, temp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, mode, buffering=buffering) as f:
+            yield f
+        os.chmod(temp, 0o666 & ~_UMASK)
+        os.replace(temp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp)
+        raise
@@ -0,0 +1,181 @@
+# batch.py
+# Batch conversion of kolam scans and SVGs to G-code across a process pool,
+# with a JSON manifest of per-file timings, path counts and errors
+# Requirements: pip install numpy svgpathtools (plus img.py's for PNG inputs)
+# Run: python batch.py scans/ --output converted --workers 4
+#      python batch.py "scans/*.png" --force --cache .kolam_cache
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from atomic_file import replacing
+from stage_cache import StageCache
+
+INPUT_EXTENSIONS = (".png", ".svg")
+OUTPUT_DIR = "converted"
+MANIFEST_NAME = "manifest.json"
+
+# -------------------------------
+# JOBS
+# -------------------------------
+def find_inputs(pattern):
+    """PNG/SVG files in a directory, or matching a glob pattern, sorted"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    return sorted(path for path in glob.glob(pattern)
+                  if os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS))
+
+def plan_job(input_path, output_dir):
+    """Output paths of one input: PNG -> G-code (and SVG), or SVG -> G-code"""
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    is_png = ext.lower() == ".png"
+    return {
+        "input": input_path,
+        "kind": "png" if is_png else "svg",
+        "svg": os.path.join(output_dir, stem + ".svg") if is_png else input_path,
+        "gcode": os.path.join(output_dir, stem + ".gcode"),
+    }
+
+def is_up_to_date(job):
+    """True if every output exists and is newer than what it is made from"""
+    chain = [job["input"], job["svg"], job["gcode"]] if job["kind"] == "png" else [job["input"], job["gcode"]]
+    try:
+        times = [os.path.getmtime(path) for path in chain]
+    except OSError:
+        return False
+    return all(later >= earlier for earlier, later in zip(times, times[1:]))
+
+def convert_file(job, scale=1.5, min_stroke_width=1.0, cache_dir=None, toolpath_file=False):
+    """Run one job in a worker; returns its manifest entry.
+
+    Errors are caught and recorded rather than raised, so one bad scan
+    does not stop the batch. The stages' console output goes to the log.
+    With cache_dir, stage results are shared through a StageCache there.
+    toolpath_file also writes each job's .ktp for the viewer (see
+    app.toolpaths_to_gcode).
+    """
+    entry = dict(job, status="converted", timings={}, counts={}, error=None)
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            cache = StageCache(cache_dir) if cache_dir else None
+            start = time.perf_counter()
+            if job["kind"] == "png":
+                # Straight from the image's polylines; the SVG is a side product
+                from app import png_to_gcode
+                entry["counts"].update(png_to_gcode(job["input"], job["gcode"], svg_path=job["svg"],
+                                                    scale=scale, min_stroke_width=min_stroke_width,
+                                                    cache=cache, toolpath_file=toolpath_file))
+                entry["timings"]["png_to_gcode"] = round(time.perf_counter() - start, 3)
+            else:
+                from app import svg_to_gcode
+                entry["counts"].update(svg_to_gcode(job["svg"], job["gcode"], cache=cache,
+                                                    toolpath_file=toolpath_file))
+                entry["timings"]["svg_to_gcode"] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["log"] = log.getvalue().splitlines()
+    return entry
+
+# -------------------------------
+# MANIFEST
+# -------------------------------
+def load_manifest(path):
+    """Previous manifest entries by input path, or {} if there is none"""
+    try:
+        with open(path) as f:
+            return {entry["input"]: entry for entry in json.load(f)["files"]}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def write_manifest(path, manifest):
+    # Written beside and renamed, so a crash never leaves half a manifest
+    with replacing(path) as f:
+        json.dump(manifest, f, indent=2)
+
+# -------------------------------
+# BATCH
+# -------------------------------
+def convert_batch(pattern, output_dir=OUTPUT_DIR, workers=None, force=False,
+                  manifest_path=None, scale=1.5, min_stroke_width=1.0, cache_dir=None,
+                  toolpath_file=False):
+    """Convert every PNG/SVG input found by pattern, writing into output_dir.
+
+    Inputs whose outputs are up to date are skipped (unless force) and
+    keep their previous manifest entry. Returns the manifest, which is
+    also written to manifest_path (output_dir/manifest.json by default).
+    cache_dir is a stage cache directory shared by the workers, and
+    toolpath_file writes each output's .ktp toolpath file too.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+    started = time.time()
+
+    entries, jobs, outputs = {}, [], {}
+    for input_path in find_inputs(pattern):
+        job = plan_job(input_path, output_dir)
+        if job["gcode"] in outputs:
+            entries[input_path] = dict(job, status="error", timings={}, counts={}, log=[],
+                                       error=f"output {job['gcode']} collides with {outputs[job['gcode']]}")
+            continue
+        outputs[job["gcode"]] = input_path
+        if not force and is_up_to_date(job):
+            entries[input_path] = dict(previous.get(input_path, job), status="up-to-date")
+        else:
+            jobs.append(job)
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(convert_file, job, scale, min_stroke_width, cache_dir, toolpath_file)
+                       for job in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                entry = future.result()
+                entries[entry["input"]] = entry
+                print(f"[{done}/{len(jobs)}] {entry['input']}: {entry['status']}"
+                      + (f" ({entry['error']})" if entry["error"] else ""))
+
+    files = [entries[path] for path in sorted(entries)]
+    manifest = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "elapsed": round(time.time() - started, 3),
+        "workers": workers or os.cpu_count(),
+        "converted": sum(entry["status"] == "converted" for entry in files),
+        "skipped": sum(entry["status"] == "up-to-date" for entry in files),
+        "errors": sum(entry["status"] == "error" for entry in files),
+        "files": files,
+    }
+    write_manifest(manifest_path, manifest)
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert kolam PNG scans and SVGs to G-code in bulk.")
+    parser.add_argument("inputs", help="directory or glob pattern of .png/.svg files")
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR, help="directory for the SVG and G-code outputs")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all CPUs)")
+    parser.add_argument("-f", "--force", action="store_true", help="convert even if outputs are up to date")
+    parser.add_argument("--manifest", default=None, help="manifest path (default: OUTPUT/manifest.json)")
+    parser.add_argument("--scale", type=float, default=1.5, help="SVG scale for PNG inputs")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="reuse stage results across runs from this directory")
+    parser.add_argument("--toolpath-file", action="store_true",
+                        help="also write a .ktp toolpath file per output for fast viewer loading")
+    args = parser.parse_args(argv)
+
+    manifest = convert_batch(args.inputs, args.output, workers=args.workers, force=args.force,
+                             manifest_path=args.manifest, scale=args.scale, cache_dir=args.cache,
+                             toolpath_file=args.toolpath_file)
+    print(f"Converted {manifest['converted']}, up to date {manifest['skipped']}, "
+          f"errors {manifest['errors']} in {manifest['elapsed']:.1f} s")
+    return 1 if manifest["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,128 +1,144 @@
 import tkinter as tk
-from tkinter import filedialog, scrolledtext, ttk, messagebox
-import re
+from tkinter import filedialog, ttk, messagebox
 import os
+import queue
+import threading
 # SVG to G-code imports
 try:
-    from svgpathtools import svg2paths
+    from svg_reader import read_svg
 except ImportError:
-    svg2paths = None
+    read_svg = None
 import sys
 import numpy as np
 
+from sampling import PathSampler, sample_path
+from toolpath import order_paths
+from gcode_writer import path_gcode, write_gcode
+from gcode_parser import load_gcode, parse_gcode
+from toolpath_file import load_toolpaths, write_toolpaths
+from lod import LodPyramid, arc_points, pen_down_paths
 
 DEFAULT_GCODE_FILE = "kolam.gcode"
 SAFE_HEIGHT = 5      # Z height for travel (mm)
 CUT_DEPTH = -2       # Cutting depth (mm)
 FEED_RATE = 500      # Cutting speed
 PLUNGE_RATE = 200    # Z axis speed
+CHECKPOINT_INTERVAL = 250   # Commands between viewer state snapshots
+TEXT_WINDOW = 400           # G-code lines held in the text pane at once
+PREVIEW_BYTES = 64 * 1024   # Head of a file parsed first for a quick preview
+LOAD_POLL_MS = 50           # How often the UI checks on a background load
+ZOOM_STEP = 1.25            # Scale change per mouse wheel notch
 
 def discretize_path(path, steps=100):
-    points = []
-    for seg in path:
-        for t in [i/steps for i in range(steps+1)]:
-            point = seg.point(t)
-            points.append((point.real, point.imag))
-    return points
+    return sample_path(path, steps=steps)
 
 def generate_gcode(points, depth=CUT_DEPTH, feed=FEED_RATE):
-    gcode = []
-    if not points:
-        return gcode
-    gcode.append(f"G0 Z{SAFE_HEIGHT}")  # lift tool
-    start = points[0]
-    gcode.append(f"G0 X{start[0]:.2f} Y{start[1]:.2f}")  # move to start
-    gcode.append(f"G1 Z{depth:.2f} F{PLUNGE_RATE}")      # plunge
-    for x, y in points[1:]:
-        gcode.append(f"G1 X{x:.2f} Y{y:.2f} F{feed}")    # cut move
-    gcode.append(f"G0 Z{SAFE_HEIGHT}")  # retract tool
-    return gcode
-
-def svg_to_gcode(input_svg, output_gcode):
-    if svg2paths is None:
+    blocks = path_gcode(points, depth=depth, feed=feed,
+                        safe_height=SAFE_HEIGHT, plunge_rate=PLUNGE_RATE)
+    return "".join(blocks).splitlines()
+
+def svg_to_gcode(input_svg, output_gcode, progress=None):
+    if read_svg is None:
         raise ImportError("svgpathtools is required for SVG conversion. Please install it with 'pip install svgpathtools'.")
-    paths, attributes = svg2paths(input_svg)
-    # Sort paths from top to bottom (assuming Y increases downward in SVG; smaller average Y is top)
-    paths = sorted(paths, key=lambda p: (p.bbox()[2] + p.bbox()[3]) / 2)  # Sort by increasing average Y (top first)
-    gcode = [
-        "G21 ; set units to mm",
-        "G90 ; absolute positioning",
-        "G17 ; XY plane"
-    ]
-    for path in paths:
-        points = discretize_path(path, steps=80)
-        gcode += generate_gcode(points)
-    gcode.append("M05 ; stop spindle")
-    gcode.append("G0 X0 Y0 ; return to origin")
-    gcode.append("M30 ; program end")
-    with open(output_gcode, "w") as f:
-        f.write("\n".join(gcode))
+    # progress() is called before every stage, so a caller can stop the
+    # conversion between stages by raising from it
+    progress = progress or (lambda fraction: None)
+    paths = read_svg(input_svg)
+    sampler = PathSampler(steps=80)
+    sampled = []
+    for i, path in enumerate(paths):
+        progress(0.7 * i / len(paths))
+        sampled.append(sampler.sample(path))
+    # Order paths nearest-neighbour style to keep rapids between them short
+    progress(0.7)
+    toolpaths = order_paths(sampled)
+    progress(0.8)
+    path_options = dict(depth=CUT_DEPTH, feed=FEED_RATE, safe_height=SAFE_HEIGHT, plunge_rate=PLUNGE_RATE)
+    write_gcode(toolpaths, output_gcode, **path_options)
+    progress(0.95)
+    write_toolpaths(output_gcode, toolpaths, **path_options)
     return True
 
-def strip_comment(line):
-    line = re.sub(r'\(.*?\)', '', line)
-    if ';' in line:
-        line = line.split(';', 1)[0]
-    return line.strip()
-
 def parse_gcode_text(text):
-    commands = []
-    prev_pos = {'X': None, 'Y': None, 'Z': None}
-    for i, raw in enumerate(text.splitlines()):
-        raw_strip = raw.strip()
-        if not raw_strip:
-            continue
-        cleaned = strip_comment(raw_strip)
-        if not cleaned:
-            commands.append({'raw': raw_strip, 'code': None, 'args': {}, 'orig_lineno': i})
-            continue
-        parts = cleaned.split()
-        code = parts[0].upper()
-        args = {}
-        for token in parts[1:]:
-            token = token.strip()
-            if len(token) < 2:
-                continue
-            key = token[0].upper()
+    return parse_gcode(text)
+
+class LoadCancelled(Exception):
+    pass
+
+class LoadJob:
+    """Convert (optionally) and parse a G-code file on a worker thread.
+
+    The worker never touches Tk; it puts messages on self.messages for the
+    UI thread to poll: ("progress", fraction, text), ("preview", program)
+    with the head of a large file, ("done", program), ("error", text) or
+    ("cancelled",).
+    """
+
+    def __init__(self, gcode_path, svg_path=None):
+        self.gcode_path = gcode_path
+        self.svg_path = svg_path
+        self.messages = queue.Queue()
+        self.preview = None   # Preview program, once the UI has shown it
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _progress(self, fraction, text):
+        if self._cancelled.is_set():
+            raise LoadCancelled()
+        self.messages.put(("progress", fraction, text))
+
+    def _run(self):
+        try:
+            start = 0.0
+            if self.svg_path:
+                self._progress(0.0, "Converting SVG")
+                svg_to_gcode(self.svg_path, self.gcode_path,
+                             progress=lambda f: self._progress(0.8 * f, "Converting SVG"))
+                start = 0.8
+            # A current binary toolpath file opens without parsing the text
             try:
-                val = float(token[1:])
-            except:
-                continue
-            args[key] = val
-        # Check for duplicate position
-        is_duplicate = True
-        for key in ['X', 'Y', 'Z']:
-            if key in args:
-                if prev_pos[key] != args[key]:
-                    is_duplicate = False
-            elif prev_pos[key] is not None:
-                is_duplicate = False
-        if is_duplicate and code in ['G0', 'G1']:
-            continue  # Skip duplicate move to same position
-        # Update prev_pos
-        for key in ['X', 'Y', 'Z']:
-            if key in args:
-                prev_pos[key] = args[key]
-        commands.append({'raw': raw_strip, 'code': code, 'args': args, 'orig_lineno': i})
-    return commands
+                program = load_toolpaths(self.gcode_path)
+            except ValueError:
+                program = None
+            if program is not None:
+                self._progress(1.0, "Loaded")
+                self.messages.put(("done", program))
+                return
+            self._progress(start, "Parsing G-code")
+            with open(self.gcode_path, "rb") as f:
+                head = f.read(PREVIEW_BYTES)
+            if len(head) == PREVIEW_BYTES:
+                # Whole lines only, so the preview is a prefix of the program
+                head = head[:head.rfind(b"\n") + 1]
+                if head:
+                    self.messages.put(("preview", parse_gcode(head)))
+            program = load_gcode(self.gcode_path)
+            self._progress(1.0, "Loaded")
+            self.messages.put(("done", program))
+        except LoadCancelled:
+            self.messages.put(("cancelled",))
+        except Exception as e:
+            self.messages.put(("error", str(e)))
 
 def is_straight_line(points, tolerance=0.1):
     if len(points) < 3:
         return True
-    points_np = np.array(points)
+    points_np = np.asarray(points, dtype=float)
     start = points_np[0]
     end = points_np[-1]
     line_vec = end - start
     line_len = np.linalg.norm(line_vec)
     if line_len == 0:
         return True
-    max_dev = 0
-    for p in points_np[1:-1]:
-        p_vec = p - start
-        proj = np.dot(p_vec, line_vec) / line_len**2 * line_vec
-        dev = np.linalg.norm(p_vec - proj)
-        if dev > max_dev:
-            max_dev = dev
+    p_vec = points_np[1:-1] - start
+    proj = (p_vec @ line_vec)[:, None] / line_len**2 * line_vec
+    max_dev = np.linalg.norm(p_vec - proj, axis=1).max()
     return max_dev < tolerance
 
 class GCodeViewer(tk.Tk):
@@ -146,14 +162,22 @@ class GCodeViewer(tk.Tk):
         self.drawn_items = []
         self.head_marker = None
         self.current_path = []  # Buffer for consecutive G1 points
+        self.checkpoints = []   # State before every CHECKPOINT_INTERVAL-th command
+        self.checkpoint_items = {}   # len(drawn_items) at checkpoints since view_base
+        self.lod = None
+        self.view_items = []    # Pyramid render of the drawing before view_base
+        self.view_base = 0
+        self.drag_from = None
+        self.text_top = self.text_bottom = 0   # Commands shown in the text pane
+        self.highlighted = None
+        self.load_job = None
 
         self._build_ui()
 
         # load G-code file if exists
         if os.path.exists(DEFAULT_GCODE_FILE):
-            with open(DEFAULT_GCODE_FILE, "r", encoding="utf-8", errors="ignore") as f:
-                txt = f.read()
-            self.load_gcode_text(txt)
+            self.load_gcode_text("")
+            self.start_load(DEFAULT_GCODE_FILE)
         else:
             self.load_gcode_text("; No G-code found: output.gcode missing\n")
 
@@ -178,6 +202,15 @@ class GCodeViewer(tk.Tk):
         ttk.Button(ctrl, text="◀ Step", command=lambda: self.step(-1)).grid(row=0, column=3, padx=4)
         ttk.Button(ctrl, text="Reset", command=self.reset_view).grid(row=0, column=4, padx=4)
         ttk.Button(ctrl, text="Generate Full", command=self.generate_full).grid(row=0, column=5, padx=4)
+        ttk.Button(ctrl, text="Fit View", command=self.fit_view).grid(row=0, column=7, padx=4)
+
+        # Wheel zooms about the pointer, dragging pans
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom(e.x, e.y, ZOOM_STEP if e.delta > 0 else 1 / ZOOM_STEP))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom(e.x, e.y, ZOOM_STEP))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom(e.x, e.y, 1 / ZOOM_STEP))
+        self.canvas.bind("<ButtonPress-1>", self._start_drag)
+        self.canvas.bind("<B1-Motion>", self._drag)
+        self.canvas.bind("<ButtonRelease-1>", self._end_drag)
 
         ttk.Label(ctrl, text="Speed (steps/s)").grid(row=1, column=0, columnspan=2, pady=(6,0))
         self.speed_var = tk.DoubleVar(value=100.0)  # Adjusted for reasonable speed
@@ -188,11 +221,19 @@ class GCodeViewer(tk.Tk):
         info.pack(fill="x", pady=(8,0))
         self.status_label = ttk.Label(info, text="Line: 0 / 0    Pos: X0 Y0 Z5    Pen: UP")
         self.status_label.pack()
+        self.load_label = ttk.Label(info, text="")
+        self.load_label.pack()
+        self.progress_bar = ttk.Progressbar(info, mode="determinate", maximum=1.0, length=300)
+        self.progress_bar.pack(side="left", expand=True, pady=(4,0))
+        self.cancel_btn = ttk.Button(info, text="Cancel", command=self.cancel_load, state="disabled")
+        self.cancel_btn.pack(side="left", padx=4, pady=(4,0))
 
         top_right = tk.Frame(right)
         top_right.pack(fill="both", expand=True)
-        self.gtext = scrolledtext.ScrolledText(top_right, width=60)
-        self.gtext.pack(fill="both", expand=True)
+        self.text_scroll = ttk.Scrollbar(top_right, orient="vertical", command=self._scroll_text)
+        self.text_scroll.pack(side="right", fill="y")
+        self.gtext = tk.Text(top_right, width=60, yscrollcommand=self._text_scrolled)
+        self.gtext.pack(side="left", fill="both", expand=True)
         self.gtext.tag_configure("current", background="#ffe79e")
 
         bottom_right = tk.Frame(right)
@@ -204,30 +245,91 @@ class GCodeViewer(tk.Tk):
         svg_path = filedialog.askopenfilename(filetypes=[("SVG files", "*.svg"), ("All files", "*.*")])
         if not svg_path:
             return
-        gcode_path = DEFAULT_GCODE_FILE
-        try:
-            svg_to_gcode(svg_path, gcode_path)
-        except Exception as e:
-            messagebox.showerror("SVG to G-code Error", str(e))
-            return
-        with open(gcode_path, "r", encoding="utf-8", errors="ignore") as f:
-            txt = f.read()
-        self.load_gcode_text(txt)
+        self.start_load(DEFAULT_GCODE_FILE, svg_path=svg_path)
 
     def load_gcode_file(self):
         path = filedialog.askopenfilename(filetypes=[("G-code files", "*.gcode *.nc *.txt"), ("All files", "*.*")])
         if not path:
             return
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            txt = f.read()
-        self.load_gcode_text(txt)
+        self.start_load(path)
+
+    def start_load(self, gcode_path, svg_path=None):
+        """Load a G-code file (converting svg_path into it first) in the background"""
+        self.cancel_load()
+        self.load_job = LoadJob(gcode_path, svg_path=svg_path)
+        self.load_job.start()
+        self.cancel_btn.config(state="normal")
+        self.after(LOAD_POLL_MS, self._poll_load, self.load_job)
+
+    def cancel_load(self):
+        if self.load_job:
+            self.load_job.cancel()
+
+    def _poll_load(self, job):
+        if job is not self.load_job:
+            return   # superseded by a newer load
+        while True:
+            try:
+                message = job.messages.get_nowait()
+            except queue.Empty:
+                self.after(LOAD_POLL_MS, self._poll_load, job)
+                return
+            kind = message[0]
+            if kind == "progress":
+                self.progress_bar.config(value=message[1])
+                self.load_label.config(text=message[2])
+            elif kind == "preview":
+                # Draw the head of the file while the rest is parsed
+                job.preview = message[1]
+                self.load_program(job.preview)
+                self.generate_full()
+            else:
+                break
+        self.load_job = None
+        self.cancel_btn.config(state="disabled")
+        if kind == "done":
+            # Keep the preview's progress if it is still on screen
+            shown = self.current_index if self.commands is job.preview else 0
+            self.load_program(message[1])
+            if shown:
+                self.seek(shown)
+                self.update_status()
+        elif kind == "error":
+            self.progress_bar.config(value=0.0)
+            self.load_label.config(text="")
+            title = "SVG to G-code Error" if job.svg_path else "G-code Load Error"
+            messagebox.showerror(title, message[1])
+        else:
+            self.progress_bar.config(value=0.0)
+            self.load_label.config(text="Load cancelled")
 
     def load_gcode_text(self, text):
-        self.commands = parse_gcode_text(text)
+        self.load_program(parse_gcode_text(text))
+
+    def load_program(self, program):
+        self.commands = program
+        # Machine position after each command, the moves that may cut and
+        # the points inside each arc (plain lists: stepping reads them one
+        # command at a time)
+        self.positions = program.positions(start=(0.0, 0.0, 5.0))
+        self.targets = self.positions.tolist()
+        codes = program.codes
+        clockwise = np.isin(codes, [program.code_id("G2"), program.code_id("G02")])
+        arc = clockwise | np.isin(codes, [program.code_id("G3"), program.code_id("G03")])
+        feed = arc | np.isin(codes, [program.code_id("G1"), program.code_id("G01")])
+        offsets = np.column_stack((np.nan_to_num(program.word("I")), np.nan_to_num(program.word("J"))))
+        self.arcs = arc_points(self.positions, arc, clockwise, offsets, start=(0.0, 0.0, 5.0))
+        self.feed = feed.tolist()
+        self.rapid = (codes == program.code_id("G0")).tolist()
         self.current_index = 0
         self.pos = {'x': 0.0, 'y': 0.0, 'z': 5.0}
         self.drawn_items.clear()
         self.current_path = []
+        self.checkpoints = []
+        self.checkpoint_items = {}
+        self.lod = LodPyramid(pen_down_paths(self.positions, self.feed, arcs=self.arcs))
+        self.view_items = []
+        self.view_base = 0
         self._compute_bounds()
         self._setup_transform()
         self._render_full_gcode_text()
@@ -237,28 +339,62 @@ class GCodeViewer(tk.Tk):
         self.update_status()
 
     def _render_full_gcode_text(self):
+        self.highlighted = None
+        self._render_text_window(0)
+
+    def _render_text_window(self, top):
+        """Put commands top..top+TEXT_WINDOW into the text pane.
+
+        Only this window of the program exists as Tk text; the scrollbar is
+        driven by _text_scrolled/_scroll_text so it still spans every line.
+        """
+        total = len(self.commands)
+        top = max(0, min(top, total - TEXT_WINDOW))
+        self.text_top, self.text_bottom = top, min(total, top + TEXT_WINDOW)
         self.gtext.config(state="normal")
         self.gtext.delete("1.0", "end")
-        for c in self.commands:
-            self.gtext.insert("end", c['raw'] + "\n")
+        if total:
+            self.gtext.insert("end", self.commands.raw_text(self.text_top, self.text_bottom) + "\n")
         self.gtext.config(state="disabled")
+        self._tag_highlight()
+
+    def _scroll_to_line(self, line):
+        """Scroll the text pane so command line is at the top"""
+        total = len(self.commands)
+        line = max(0, min(int(line), total - 1))
+        top = max(0, min(line - TEXT_WINDOW // 2, total - TEXT_WINDOW))
+        if top != self.text_top:
+            self._render_text_window(top)
+        shown = self.text_bottom - self.text_top
+        if shown:
+            self.gtext.yview_moveto((line - self.text_top) / shown)
+
+    def _scroll_text(self, *args):
+        # Scrollbar command: fractions refer to the whole program
+        if args[0] == "moveto":
+            self._scroll_to_line(float(args[1]) * len(self.commands))
+        else:
+            self.gtext.yview(*args)
+
+    def _text_scrolled(self, first, last):
+        # Text yscrollcommand: fractions refer to the window shown
+        first, last = float(first), float(last)
+        total = len(self.commands)
+        shown = self.text_bottom - self.text_top
+        if not shown:
+            self.text_scroll.set(0.0, 1.0)
+            return
+        top_line = self.text_top + first * shown
+        self.text_scroll.set(top_line / total, (self.text_top + last * shown) / total)
+        # Slide the window along once the view reaches one of its edges
+        if (first <= 0.0 and self.text_top > 0) or (last >= 1.0 and self.text_bottom < total):
+            self.after_idle(self._scroll_to_line, top_line)
 
     def _compute_bounds(self):
-        x = 0.0
-        y = 0.0
-        min_x = min_y = float("inf")
-        max_x = max_y = float("-inf")
-        for c in self.commands:
-            args = c['args']
-            if 'X' in args:
-                x = args['X']
-            if 'Y' in args:
-                y = args['Y']
-            if x < min_x: min_x = x
-            if x > max_x: max_x = x
-            if y < min_y: min_y = y
-            if y > max_y: max_y = y
-        if min_x == float("inf"):
+        if len(self.positions):
+            min_x, min_y = self.positions[:, :2].min(axis=0).tolist()
+            max_x, max_y = self.positions[:, :2].max(axis=0).tolist()
+        else:
             min_x = 0; max_x = 100
             min_y = 0; max_y = 100
         self.min_x, self.max_x, self.min_y, self.max_y = min_x, max_x, min_y, max_y
@@ -273,14 +409,82 @@ class GCodeViewer(tk.Tk):
         scale_y = (h - 2 * pad) / data_h
         self.scale = min(scale_x, scale_y)
         self.offset_x = pad - self.min_x * self.scale
-        self.offset_y = pad + self.min_y * self.scale
+        self.offset_y = h - pad + self.min_y * self.scale
         self.w = w; self.h = h
 
     def coord_to_canvas(self, x, y):
         cx = self.offset_x + x * self.scale
-        cy = self.h - (self.pad + (y - self.min_y) * self.scale)
+        cy = self.offset_y - y * self.scale
         return cx, cy
 
+    def coords_to_canvas(self, points):
+        """coord_to_canvas for an (N,2) array, flattened to x0, y0, x1, y1, ..."""
+        points = np.asarray(points, dtype=float)
+        cx = self.offset_x + points[:, 0] * self.scale
+        cy = self.offset_y - points[:, 1] * self.scale
+        return np.column_stack((cx, cy)).ravel().tolist()
+
+    def canvas_to_coord(self, cx, cy):
+        return (cx - self.offset_x) / self.scale, (self.offset_y - cy) / self.scale
+
+    # Zoom and pan
+    def zoom(self, cx, cy, factor):
+        """Scale the view by factor, keeping the point under (cx, cy) in place"""
+        self.offset_x = cx - (cx - self.offset_x) * factor
+        self.offset_y = cy - (cy - self.offset_y) * factor
+        self.scale *= factor
+        self._redraw_view()
+
+    def fit_view(self):
+        self._setup_transform()
+        self._redraw_view()
+
+    def _start_drag(self, event):
+        self.drag_from = (event.x, event.y)
+
+    def _drag(self, event):
+        if self.drag_from is None:
+            return
+        dx, dy = event.x - self.drag_from[0], event.y - self.drag_from[1]
+        self.drag_from = (event.x, event.y)
+        # Shift what is drawn now; newly exposed tiles come in on release
+        self.canvas.move("world", dx, dy)
+        self.offset_x += dx
+        self.offset_y += dy
+
+    def _end_drag(self, event):
+        if self.drag_from is not None:
+            self.drag_from = None
+            self._redraw_view()
+
+    def _redraw_view(self):
+        self._render_view(self.current_index)
+        self._move_head_marker(self.pos['x'], self.pos['y'])
+
+    def _render_view(self, base):
+        """Redraw everything the first base commands drew from the LOD pyramid.
+
+        Only tiles inside the canvas are drawn, at the pyramid level that
+        matches the current scale. Items drawn by later commands go on top
+        in drawn_items as usual.
+        """
+        items = self.view_items + self.drawn_items
+        if items:
+            self.canvas.delete(*items)
+        self.drawn_items.clear()
+        self.checkpoint_items = {}
+        self.view_base = base
+        x0, y1 = self.canvas_to_coord(0, 0)
+        x1, y0 = self.canvas_to_coord(self.canvas_width, self.canvas_height)
+        lines = self.lod.visible((x0, y0, x1, y1), self.scale, upto=base) if base else []
+        self.view_items = [
+            self.canvas.create_line(self.coords_to_canvas(points), width=2, capstyle="round",
+                                    joinstyle="round", fill="green", tags="world")
+            for points in lines
+        ]
+        if self.head_marker:
+            self.canvas.tag_raise(self.head_marker)
+
     def _clear_canvas(self):
         self.canvas.delete("all")
         self.head_marker = None
@@ -292,7 +496,7 @@ class GCodeViewer(tk.Tk):
         x, y = self.pos['x'], self.pos['y']
         cx, cy = self.coord_to_canvas(x, y)
         r = 5
-        self.head_marker = self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, fill="red")
+        self.head_marker = self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, fill="red", tags="world")
 
     def _move_head_marker(self, x, y):
         cx, cy = self.coord_to_canvas(x, y)
@@ -300,7 +504,7 @@ class GCodeViewer(tk.Tk):
         if self.head_marker:
             self.canvas.coords(self.head_marker, cx-r, cy-r, cx+r, cy+r)
         else:
-            self.head_marker = self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, fill="red")
+            self.head_marker = self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, fill="red", tags="world")
 
     def toggle_play(self):
         if self.is_playing:
@@ -324,70 +528,75 @@ class GCodeViewer(tk.Tk):
         if direction == 1:
             if self.current_index >= len(self.commands):
                 self._draw_current_path()  # Ensure last path is drawn
+                self.current_path = []
                 self.is_playing = False
                 self.play_btn.config(text="Play Step-by-Step")
                 return
-            cmd = self.commands[self.current_index]
-            self._execute_command(cmd)
             self._highlight_line(self.current_index)
-            self.current_index += 1
+            self._advance()
         else:
-            new_index = max(0, self.current_index - 1)
-            self._reset_and_replay_to(new_index)
+            self.seek(max(0, self.current_index - 1))
         self.update_status()
 
     def generate_full(self):
-        self._reset_and_replay_to(len(self.commands))
-        self.current_index = len(self.commands)
+        self.seek(len(self.commands))
         self._draw_current_path()  # Ensure last path is drawn
-        self._highlight_line(self.current_index - 1 if self.commands else 0)
-        self.update_status()
-
-    def _reset_and_replay_to(self, index):
-        self.pos = {'x': 0.0, 'y': 0.0, 'z': 5.0}
-        for item in self.drawn_items:
-            self.canvas.delete(item)
-        self.drawn_items.clear()
-        if self.head_marker:
-            self.canvas.delete(self.head_marker)
-            self.head_marker = None
-        self._place_head_marker()
         self.current_path = []
-        self.current_index = 0
-        for i in range(index):
-            cmd = self.commands[i]
-            self._execute_command(cmd)
-            self.current_index += 1
-        if index > 0:
-            self._highlight_line(index - 1)
-        else:
-            self._highlight_line(0)
+        self.update_status()
 
-    def _execute_command(self, cmd):
-        code = cmd.get('code')
-        args = cmd.get('args', {})
+    def seek(self, index):
+        """Show the drawing as it stands after the first index commands.
+
+        Going back restores the nearest checkpoint at or before index and
+        deletes only the canvas items drawn since, so at most
+        CHECKPOINT_INTERVAL commands are replayed. A checkpoint from before
+        the last view change is redrawn from the LOD pyramid instead.
+        """
+        index = max(0, min(index, len(self.commands)))
+        if index < self.current_index:
+            k = index // CHECKPOINT_INTERVAL
+            pos, path = self.checkpoints[k]
+            item_count = self.checkpoint_items.get(k)
+            if item_count is None:
+                self._render_view(k * CHECKPOINT_INTERVAL)
+            elif len(self.drawn_items) > item_count:
+                self.canvas.delete(*self.drawn_items[item_count:])
+                del self.drawn_items[item_count:]
+            self.pos = pos.copy()
+            self.current_path = list(path)
+            self.current_index = k * CHECKPOINT_INTERVAL
+        while self.current_index < index:
+            self._advance(move_marker=False)
+        self._move_head_marker(self.pos['x'], self.pos['y'])
+        self._highlight_line(index - 1 if index > 0 else 0)
+
+    def _advance(self, move_marker=True):
+        """Execute the next command, snapshotting state on interval boundaries"""
+        i = self.current_index
+        if i % CHECKPOINT_INTERVAL == 0:
+            k = i // CHECKPOINT_INTERVAL
+            if k == len(self.checkpoints):
+                self.checkpoints.append((self.pos.copy(), list(self.current_path)))
+            self.checkpoint_items.setdefault(k, len(self.drawn_items))
+        self._execute_command(i, move_marker)
+        self.current_index += 1
+
+    def _execute_command(self, index, move_marker=True):
         prev = self.pos.copy()
-        new_x, new_y, new_z = prev['x'], prev['y'], prev['z']
-
-        if 'X' in args: new_x = args['X']
-        if 'Y' in args: new_y = args['Y']
-        if 'Z' in args: new_z = args['Z']
-
-        draw = False
-        if code is not None:
-            if code.startswith('G'):
-                gnum = code[1:]
-                if gnum in ('1', '01'):
-                    if (prev['z'] <= 0.0) or (new_z <= 0.0):
-                        if (new_x != prev['x']) or (new_y != prev['y']):
-                            draw = True
-
-        xy_changed = (new_x != prev['x']) or (new_y != prev['y'])
+        new_x, new_y, new_z = self.targets[index]
+
+        # An arc draws even when it ends where it started (a full circle)
+        inside = self.arcs.get(index)
+        xy_changed = (new_x != prev['x']) or (new_y != prev['y']) or inside is not None
+        draw = self.feed[index] and ((prev['z'] <= 0.0) or (new_z <= 0.0)) and xy_changed
+
         if xy_changed:
             if draw:
                 # Buffer the point for potential straight line simplification
                 if not self.current_path:
                     self.current_path = [(prev['x'], prev['y'])]
+                if inside is not None:
+                    self.current_path.extend(map(tuple, inside.tolist()))
                 self.current_path.append((new_x, new_y))
             else:
                 # Non-draw move: Draw any pending path and reset buffer
@@ -396,10 +605,11 @@ class GCodeViewer(tk.Tk):
 
         # Update position and move marker
         self.pos['x'], self.pos['y'], self.pos['z'] = new_x, new_y, new_z
-        self._move_head_marker(new_x, new_y)
+        if move_marker:
+            self._move_head_marker(new_x, new_y)
 
         # If Z lift or end of commands, draw the path
-        if new_z > 0 or code == 'G0':
+        if new_z > 0 or self.rapid[index]:
             self._draw_current_path()
             self.current_path = []
 
@@ -409,29 +619,29 @@ class GCodeViewer(tk.Tk):
         points = self.current_path
         if is_straight_line(points):
             # Draw single straight line from start to end
-            start_x, start_y = points[0]
-            end_x, end_y = points[-1]
-            x1, y1 = self.coord_to_canvas(start_x, start_y)
-            x2, y2 = self.coord_to_canvas(end_x, end_y)
-            line_id = self.canvas.create_line(x1, y1, x2, y2, width=2, capstyle="round", joinstyle="round", fill="green")
-            self.drawn_items.append(line_id)
-        else:
-            # Draw as segmented lines
-            for i in range(len(points) - 1):
-                x1, y1 = self.coord_to_canvas(points[i][0], points[i][1])
-                x2, y2 = self.coord_to_canvas(points[i+1][0], points[i+1][1])
-                line_id = self.canvas.create_line(x1, y1, x2, y2, width=2, capstyle="round", joinstyle="round", fill="green")
-                self.drawn_items.append(line_id)
+            points = [points[0], points[-1]]
+        # One polyline item per pen-down path
+        line_id = self.canvas.create_line(self.coords_to_canvas(points), width=2, capstyle="round", joinstyle="round", fill="green", tags="world")
+        self.drawn_items.append(line_id)
 
     def _highlight_line(self, lineno):
+        if not 0 <= lineno < len(self.commands):
+            self.highlighted = None
+            self._tag_highlight()
+            return
+        self.highlighted = lineno
+        if not self.text_top <= lineno < self.text_bottom:
+            self._render_text_window(lineno - TEXT_WINDOW // 4)
+        self.gtext.see(f"{self._tag_highlight()}.0")
+
+    def _tag_highlight(self):
+        """Tag the highlighted command if it is in the text window; returns its text row"""
         self.gtext.tag_remove("current", "1.0", "end")
-        char_line = 1
-        for i, c in enumerate(self.commands):
-            if i == lineno:
-                self.gtext.tag_add("current", f"{char_line}.0", f"{char_line}.0 lineend")
-                self.gtext.see(f"{char_line}.0")
-                break
-            char_line += 1
+        if self.highlighted is None or not self.text_top <= self.highlighted < self.text_bottom:
+            return None
+        row = self.highlighted - self.text_top + 1
+        self.gtext.tag_add("current", f"{row}.0", f"{row}.0 lineend")
+        return row
 
     def reset_view(self):
         self.is_playing = False
@@ -442,6 +652,9 @@ class GCodeViewer(tk.Tk):
         for item in self.drawn_items:
             self.canvas.delete(item)
         self.drawn_items.clear()
+        self.view_items = []
+        self.view_base = 0
+        self.checkpoint_items = {}
         self.current_path = []
         self._clear_canvas()
         self._draw_axes()
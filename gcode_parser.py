@@ -0,0 +1,281 @@
+# gcode_parser.py
+# Columnar G-code parser: the whole file is tokenized with NumPy byte
+# operations instead of per-line string handling
+# Requirements: pip install numpy
+
+import numpy as np
+
+_SEPARATOR = np.zeros(256, dtype=bool)
+_SEPARATOR[[9, 10, 11, 12, 13, 32]] = True   # whitespace and newline bytes
+_UPPER = np.arange(256).astype(np.uint8)
+_UPPER[ord('a'):ord('z') + 1] -= 32
+_CODE_WIDTH = 16     # Longest command word packed into the code table
+_NUMERIC = np.zeros(256, dtype=bool)
+_NUMERIC[np.frombuffer(b" 0123456789+-.eE", dtype=np.uint8)] = True
+
+class GCodeProgram:
+    """A parsed G-code program stored column by column.
+
+    Command i came from source line lineno[i]. codes[i] indexes code_names
+    (-1 for a comment-only line) and words maps each argument letter to a
+    float array that is NaN where the command does not use it. The raw text
+    of a command is kept as a byte range into the source buffer.
+    """
+
+    def __init__(self, buffer, codes, code_names, words, lineno, raw_start, raw_end):
+        self.buffer = buffer
+        self.codes = codes
+        self.code_names = code_names
+        self.words = words
+        self.lineno = lineno
+        self.raw_start = raw_start
+        self.raw_end = raw_end
+
+    def __len__(self):
+        return len(self.codes)
+
+    def word(self, letter):
+        """Values of one argument letter, NaN where absent"""
+        column = self.words.get(letter)
+        return column if column is not None else np.full(len(self), np.nan)
+
+    @property
+    def x(self):
+        return self.word('X')
+
+    @property
+    def y(self):
+        return self.word('Y')
+
+    @property
+    def z(self):
+        return self.word('Z')
+
+    @property
+    def f(self):
+        return self.word('F')
+
+    def code_id(self, name):
+        """Index of a command word in code_names, or -2 if it never occurs"""
+        try:
+            return self.code_names.index(name)
+        except ValueError:
+            return -2
+
+    def code(self, i):
+        code = self.codes[i]
+        return self.code_names[code] if code >= 0 else None
+
+    def args(self, i):
+        return {k: float(v[i]) for k, v in self.words.items() if not np.isnan(v[i])}
+
+    def raw(self, i):
+        return bytes(self.buffer[self.raw_start[i]:self.raw_end[i]]).decode("utf-8", errors="ignore")
+
+    def raw_text(self, start=0, stop=None):
+        """Raw text of commands start..stop, one per line"""
+        stop = len(self) if stop is None else stop
+        return "\n".join(self.raw(i) for i in range(start, stop))
+
+    def command(self, i):
+        """Command i in the dict form {'raw', 'code', 'args', 'orig_lineno'}"""
+        return {'raw': self.raw(i), 'code': self.code(i), 'args': self.args(i),
+                'orig_lineno': int(self.lineno[i])}
+
+    def positions(self, start=(0.0, 0.0, 5.0)):
+        """(N,3) machine position after each command, carrying unset axes forward"""
+        columns = []
+        for letter, initial in zip("XYZ", start):
+            values = self.word(letter)
+            present = ~np.isnan(values)
+            last = np.maximum.accumulate(np.where(present, np.arange(len(values)), -1))
+            columns.append(np.where(last >= 0, values[np.maximum(last, 0)], initial))
+        return np.column_stack(columns) if columns[0].size else np.empty((0, 3))
+
+# -------------------------------
+# PARSING
+# -------------------------------
+def _forward_fill_previous(values):
+    """For each row, the last non-NaN value strictly before it (NaN if none)"""
+    present = ~np.isnan(values)
+    last = np.maximum.accumulate(np.where(present, np.arange(len(values)), -1))
+    previous = np.concatenate(([-1], last))[:-1]
+    return np.where(previous >= 0, values[np.maximum(previous, 0)], np.nan)
+
+def _runs(separator):
+    """Start and end offsets of the runs of non-separator bytes"""
+    if len(separator) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    edges = np.flatnonzero(separator[1:] != separator[:-1]) + 1
+    edges = np.concatenate(([0] if not separator[0] else [], edges,
+                            [len(separator)] if not separator[-1] else []))
+    return edges[0::2].astype(np.int64), edges[1::2].astype(np.int64)
+
+def _spans(marks_on, marks_off, n):
+    """Boolean mask covering each [on, off) range"""
+    counts = np.bincount(marks_on, minlength=n + 1) - np.bincount(marks_off, minlength=n + 1)
+    return np.cumsum(counts[:n]) > 0
+
+def _comment_mask(data, newlines, semicolons):
+    """Mask of the bytes in comments if there are (...) comments, else None.
+
+    Parentheses pair like the non-greedy regex \\(.*?\\): each ')' closes the
+    first '(' after the previous ')' on its line, if there is one. A ';'
+    outside them comments out the rest of its line.
+    """
+    opens = np.flatnonzero(data == ord('('))
+    if len(opens) == 0:
+        return None
+    n = len(data)
+    line_start = np.concatenate(([0], newlines + 1))
+    line_end = np.concatenate((newlines, [n]))
+    closes = np.flatnonzero(data == ord(')'))
+    previous = np.concatenate(([-1], closes[:-1]))
+    # A close on a new line starts its search at the line start
+    previous = np.maximum(previous, line_start[np.searchsorted(newlines, closes)] - 1)
+    paired = opens[np.minimum(np.searchsorted(opens, previous + 1), len(opens) - 1)]
+    ok = (paired > previous) & (paired < closes)
+    if not ok.any():
+        return None
+    mask = _spans(paired[ok], closes[ok] + 1, n)
+    semicolons = semicolons[~mask[semicolons]]
+    return mask | _spans(semicolons, line_end[np.searchsorted(newlines, semicolons)], n)
+
+def _parse_values(text, starts, ends):
+    """float() of each text[starts[k]:ends[k]], NaN where it does not parse"""
+    values = np.full(len(starts), np.nan)
+    for k, (start, end) in enumerate(zip(starts, ends)):
+        try:
+            values[k] = float(text[start:end].tobytes())
+        except ValueError:
+            pass
+    return values
+
+def duplicate_moves(codes, code_names, words):
+    """Mask of the G0/G1 moves that leave X, Y and Z as they were"""
+    duplicate = np.isin(codes, [code_names.index(c) for c in ("G0", "G1") if c in code_names])
+    for letter in "XYZ":
+        column = words.get(letter, np.full(len(codes), np.nan))
+        previous = _forward_fill_previous(column)
+        present = ~np.isnan(column)
+        duplicate &= np.where(present, previous == column, np.isnan(previous))
+    return duplicate
+
+def parse_gcode(source):
+    """Parse G-code text, bytes or a buffer into a GCodeProgram.
+
+    Comments in parentheses or after ';' are removed, blank lines skipped,
+    and the first word of a line becomes its code. Following words are
+    read as a letter and a number. A G0/G1 move that names no new X/Y/Z
+    position is dropped.
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    data = np.frombuffer(source, dtype=np.uint8)
+    newlines = np.flatnonzero(data == 10)
+
+    # Stripped raw text of each line; lines with nothing on them are skipped
+    word_start, word_end = _runs(_SEPARATOR[data])
+    word_line = np.searchsorted(newlines, word_start)
+    line_first = np.ones(len(word_line), dtype=bool)
+    line_first[1:] = word_line[1:] != word_line[:-1]
+    line_last = np.roll(line_first, -1)
+    lines = word_line[line_first]
+    raw_start, raw_end = word_start[line_first], word_end[line_last]
+    count = len(lines)
+
+    # Tokens: the words of each line with comments removed
+    semicolons = np.flatnonzero(data == ord(';'))
+    comments = _comment_mask(data, newlines, semicolons)
+    if comments is not None:
+        # Cut (...) comments out so the text either side joins up
+        text = data[~comments]
+        token_start, token_end = _runs(_SEPARATOR[text])
+        token_line = np.searchsorted(np.flatnonzero(text == 10), token_start)
+    elif len(semicolons):
+        # Drop words after a ';' on their line; a word running into one ends there
+        text = data
+        after = np.searchsorted(semicolons, word_start, side="right")
+        line_start = np.concatenate(([0], newlines + 1))[word_line]
+        commented = (after > 0) & (semicolons[np.maximum(after - 1, 0)] >= line_start)
+        following = semicolons[np.minimum(after, len(semicolons) - 1)]
+        clipped = (after < len(semicolons)) & (following < word_end)
+        token_start = word_start[~commented]
+        token_end = np.where(clipped, following, word_end)[~commented]
+        token_line = word_line[~commented]
+    else:
+        text, token_start, token_end, token_line = data, word_start, word_end, word_line
+    token_command = np.searchsorted(lines, token_line)
+    first_token = np.ones(len(token_line), dtype=bool)
+    first_token[1:] = token_line[1:] != token_line[:-1]
+
+    # Codes: the first word of each line, upper-cased, looked up in a table
+    codes = np.full(count, -1, dtype=np.int32)
+    code_start, code_end = token_start[first_token], token_end[first_token]
+    width = min(_CODE_WIDTH, int((code_end - code_start).max(initial=1)))
+    packed = np.zeros((len(code_start), width), dtype=np.uint8)
+    for k in range(width):
+        inside = code_start + k < code_end
+        packed[inside, k] = _UPPER[text[code_start[inside] + k]]
+    names = packed.view(f"S{width}").ravel()
+    long_codes = np.flatnonzero(code_end - code_start > width)
+    if len(long_codes):
+        names = names.astype(object)
+        for k in long_codes:
+            names[k] = _UPPER[text[code_start[k]:code_end[k]]].tobytes()
+    table, code_index = np.unique(names, return_inverse=True)
+    code_names = tuple(name.decode("utf-8", errors="ignore") for name in table)
+    codes[token_command[first_token]] = code_index.ravel()
+
+    # Arguments: a letter followed by a number. Copying just the numbers into
+    # a blank buffer lets NumPy's C parser read them all in one call; if the
+    # copy holds anything but numbers, fall back to float() per argument.
+    arg = ~first_token & (token_end - token_start >= 2)
+    value_start, value_end = token_start[arg] + 1, token_end[arg]
+    marks = np.zeros(len(text) + 1, dtype=np.int8)
+    marks[value_start] = 1
+    marks[value_end] = -1
+    numbers = np.where(np.cumsum(marks[:-1], dtype=np.int8) > 0, text, np.uint8(32))
+    values = None
+    if _NUMERIC[numbers].all():
+        try:
+            values = np.fromstring(numbers.tobytes(), sep=" ")
+        except ValueError:  # malformed number
+            values = None
+        if values is not None and len(values) != len(value_start):
+            values = None
+    if values is None:
+        values = _parse_values(text, value_start, value_end)
+    parsed = ~np.isnan(values)
+    arg_command = token_command[arg][parsed]
+    arg_letter = _UPPER[text[token_start[arg][parsed]]]
+    values = values[parsed]
+
+    words = {}
+    for letter in np.unique(arg_letter):
+        column = np.full(count, np.nan)
+        picked = arg_letter == letter
+        column[arg_command[picked]] = values[picked]   # the last repeat wins
+        words[chr(letter)] = column
+
+    kept = ~duplicate_moves(codes, code_names, words)
+
+    return GCodeProgram(
+        buffer=source,
+        codes=codes[kept],
+        code_names=code_names,
+        words={k: v[kept] for k, v in words.items()},
+        lineno=lines[kept],
+        raw_start=raw_start[kept],
+        raw_end=raw_end[kept],
+    )
+
+def load_gcode(path):
+    """Read a G-code file in one go and parse it.
+
+    The program keeps its own copy of the bytes rather than a memory map:
+    raw text is read long after loading, and a mapped file rewritten in
+    place meanwhile would fault on access.
+    """
+    with open(path, "rb") as f:
+        return parse_gcode(f.read())
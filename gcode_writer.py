@@ -0,0 +1,107 @@
+# gcode_writer.py
+# Streaming G-code emitter: toolpaths are formatted block by block and written
+# straight to a file or any writable text stream (stdout, socket.makefile("w"))
+# Requirements: pip install numpy
+
+import os
+import numpy as np
+
+from atomic_file import replacing
+
+SAFE_HEIGHT = 5      # Z height for travel (mm)
+CUT_DEPTH = -2       # Cutting depth (mm)
+FEED_RATE = 500      # Cutting speed
+PLUNGE_RATE = 200    # Z axis speed
+
+PROGRAM_HEADER = (
+    "G21 ; set units to mm",
+    "G90 ; absolute positioning",
+    "G17 ; XY plane",
+)
+PROGRAM_FOOTER = (
+    "M05 ; stop spindle",
+    "G0 X0 Y0 ; return to origin",
+    "M30 ; program end",
+)
+
+MOVES_PER_BLOCK = 8192   # Points formatted per string operation
+WRITE_BUFFER = 1 << 20   # Output buffer size (bytes)
+
+# -------------------------------
+# FORMATTING
+# -------------------------------
+def format_moves(points, code="G1", feed=None):
+    """Format an (N,2) array as N move lines with a single % operation"""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    line = f"{code} X%.2f Y%.2f" + (f" F{feed}" if feed is not None else "") + "\n"
+    return (line * len(points)) % tuple(points.ravel().tolist())
+
+def format_arcs(points, centres, code="G2", feed=None):
+    """Format N arc moves from end points and I/J centre offsets, both (N,2)"""
+    rows = np.hstack((np.asarray(points, dtype=float).reshape(-1, 2),
+                      np.asarray(centres, dtype=float).reshape(-1, 2)))
+    line = f"{code} X%.2f Y%.2f I%.4f J%.4f" + (f" F{feed}" if feed is not None else "") + "\n"
+    return (line * len(rows)) % tuple(rows.ravel().tolist())
+
+def _cut_blocks(points, moves, feed):
+    """Yield the cutting moves of a path, grouped into runs of the same G code"""
+    if moves is None:
+        for i in range(1, len(points), MOVES_PER_BLOCK):
+            yield format_moves(points[i:i + MOVES_PER_BLOCK], "G1", feed)
+        return
+    if len(moves) == 0:
+        return
+    codes = moves[:, 0].astype(int)
+    runs = np.split(np.arange(len(codes)), np.flatnonzero(np.diff(codes)) + 1)
+    for run in runs:
+        for block in np.array_split(run, -(-len(run) // MOVES_PER_BLOCK)):
+            if codes[block[0]] == 1:
+                yield format_moves(points[block + 1], "G1", feed)
+            else:
+                yield format_arcs(points[block + 1], moves[block, 1:], f"G{codes[block[0]]}", feed)
+
+def path_gcode(points, depth=CUT_DEPTH, feed=FEED_RATE,
+               safe_height=SAFE_HEIGHT, plunge_rate=PLUNGE_RATE):
+    """Yield the text blocks that cut one path: lift, rapid, plunge, cut, retract.
+
+    points is an (N,2) array of G1 targets, or an arc-fitted path with
+    points and moves attributes (see toolpath.ArcPath).
+    """
+    moves = getattr(points, "moves", None)
+    points = getattr(points, "points", points)
+    if len(points) == 0:
+        return
+    yield f"G0 Z{safe_height}\n"                          # lift tool
+    yield format_moves(points[:1], "G0")                  # move to start
+    yield f"G1 Z{depth:.2f} F{plunge_rate}\n"             # plunge
+    yield from _cut_blocks(points, moves, feed)           # cut moves
+    yield f"G0 Z{safe_height}\n"                          # retract tool
+
+def program_gcode(toolpaths, **path_options):
+    """Yield a complete program for an iterable of toolpaths, one block at a time"""
+    yield "\n".join(PROGRAM_HEADER) + "\n"
+    for points in toolpaths:
+        yield from path_gcode(points, **path_options)
+    yield "\n".join(PROGRAM_FOOTER) + "\n"
+
+# -------------------------------
+# OUTPUT
+# -------------------------------
+def write_gcode(toolpaths, output, **path_options):
+    """Stream a program for toolpaths to a file path or a writable text stream"""
+    if isinstance(output, (str, os.PathLike)):
+        with replacing(output, buffering=WRITE_BUFFER) as f:
+            write_gcode(toolpaths, f, **path_options)
+        return
+    for block in program_gcode(toolpaths, **path_options):
+        output.write(block)
+    output.flush()
+
+def write_text(text, output):
+    """Write an already formatted program to a file path or a writable text stream"""
+    if isinstance(output, (str, os.PathLike)):
+        with replacing(output, buffering=WRITE_BUFFER) as f:
+            f.write(text)
+        return
+    output.write(text)
+    output.flush()
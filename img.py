@@ -1,10 +1,13 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import cv2
 import numpy as np
 import svgwrite
 import torch
 from torch import nn
-import torchvision.transforms as transforms
-from PIL import Image
+
+from stage_cache import NO_CACHE
 
 # Custom simple U-Net model for binary segmentation (AI enhancement)
 class SimpleUNet(nn.Module):
@@ -50,95 +53,160 @@ class SimpleUNet(nn.Module):
         out = self.sigmoid(self.out(d1))
         return out
 
-def zhangSuen(image): 
-    def neighbours(x, y, img):
-        """Return 8-neighbours of point (x,y) in clockwise order."""
-        return [
-            img[x-1, y],   img[x-1, y+1], img[x, y+1],   img[x+1, y+1],
-            img[x+1, y],   img[x+1, y-1], img[x, y-1],   img[x-1, y-1]
-        ]
+class UNetSegmenter:
+    """A SimpleUNet loaded once and reused for every image.
+
+    Images are segmented at native resolution: the model runs on
+    overlapping tile x tile windows, batch_size of them per forward pass,
+    and the window outputs are blended with weights that fade out over the
+    overlap so tile borders do not show. torchscript=True runs a frozen
+    TorchScript version of the model; num_threads sets torch's CPU threads.
+    """
+
+    def __init__(self, model_path, tile=256, overlap=32, batch_size=8, num_threads=None, torchscript=False):
+        if tile % 4:
+            raise ValueError("tile must be a multiple of 4 (the U-Net pools twice)")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        model = SimpleUNet()
+        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
+        model.eval()
+        if torchscript:
+            model = torch.jit.freeze(torch.jit.script(model))
+        self.model = model
+        self.model_path = model_path
+        self.tile = tile
+        self.overlap = overlap
+        self.stride = tile - overlap
+        self.batch_size = batch_size
+        ramp = np.minimum(np.arange(tile) + 1, np.arange(tile)[::-1] + 1) / (overlap + 1)
+        ramp = np.clip(ramp, 0.0, 1.0).astype(np.float32)
+        self.window = np.outer(ramp, ramp)
+
+    def _starts(self, size):
+        starts = list(range(0, size - self.tile, self.stride))
+        return starts + [size - self.tile]
+
+    def _run(self, batch):
+        with torch.inference_mode():
+            output = self.model(torch.from_numpy(np.stack(batch)[:, None]))
+        return output[:, 0].cpu().numpy()
+
+    def probabilities(self, image):
+        """Per-pixel stroke probability of a grayscale uint8 image"""
+        h, w = image.shape
+        # Same scaling as ToTensor + Normalize(0.5, 0.5); reflect small images up to a tile
+        x = (image.astype(np.float32) / 255.0 - 0.5) / 0.5
+        x = np.pad(x, ((0, max(0, self.tile - h)), (0, max(0, self.tile - w))), mode="reflect")
+        total = np.zeros(x.shape, dtype=np.float32)
+        weight = np.zeros(x.shape, dtype=np.float32)
+        windows = [(y, x0) for y in self._starts(x.shape[0]) for x0 in self._starts(x.shape[1])]
+        for first in range(0, len(windows), self.batch_size):
+            chunk = windows[first:first + self.batch_size]
+            output = self._run([x[y:y + self.tile, x0:x0 + self.tile] for y, x0 in chunk])
+            for (y, x0), probability in zip(chunk, output):
+                total[y:y + self.tile, x0:x0 + self.tile] += probability * self.window
+                weight[y:y + self.tile, x0:x0 + self.tile] += self.window
+        return (total / weight)[:h, :w]
 
-    def transitions(n):
-        """Number of 0 to 1 transitions in the ordered sequence."""
-        n = n + [n[0]]  # Wrap around
-        return sum((a == 0 and b == 1) for a, b in zip(n, n[1:]))
+    def __call__(self, image):
+        """Binary stroke mask (255 = stroke) of a grayscale uint8 image"""
+        return ((self.probabilities(image) > 0.5) * 255).astype(np.uint8)
 
+@lru_cache(maxsize=4)
+def get_segmenter(model_path, **options):
+    """Shared UNetSegmenter for a model file, loaded on first use in this process"""
+    return UNetSegmenter(model_path, **options)
+
+# 8-neighbours P2..P9 as (row, col) offsets, clockwise from north
+_NEIGHBOUR_OFFSETS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+def _zhang_suen_tables():
+    """Deletion tables for both sub-iterations, indexed by 8-bit neighbourhood code."""
+    n = (np.arange(256)[:, None] >> np.arange(8)) & 1
+    count = n.sum(axis=1)
+    transitions = ((n == 0) & (np.roll(n, -1, axis=1) == 1)).sum(axis=1)
+    base = (count >= 2) & (count <= 6) & (transitions == 1)
+    first = base & (n[:, 0] * n[:, 2] * n[:, 4] == 0) & (n[:, 2] * n[:, 4] * n[:, 6] == 0)
+    second = base & (n[:, 0] * n[:, 2] * n[:, 6] == 0) & (n[:, 0] * n[:, 4] * n[:, 6] == 0)
+    return first, second
+
+_ZHANG_SUEN_TABLES = _zhang_suen_tables()
+
+def zhangSuen(image):
+    """Zhang-Suen thinning of a 0/1 image.
+
+    Each pixel's 8-neighbourhood is encoded as a 0-255 code and looked up in
+    a precomputed deletion table. After the first pass only pixels next to
+    the previous two sub-iterations' deletions are re-examined, since no
+    other neighbourhood can have changed since it was last tested.
+    """
     img = image.copy().astype(np.uint8)  # Ensure uint8
     rows, cols = img.shape
-    changing1 = changing2 = True
-    while changing1 or changing2:
-        changing1 = []
-        for x in range(1, rows - 1):
-            for y in range(1, cols - 1):
-                if img[x, y] != 1:
-                    continue
-                n = neighbours(x, y, img)
-                n_sum = sum(n)
-                if (2 <= n_sum <= 6 and
-                    transitions(n) == 1 and
-                    n[0] * n[2] * n[4] == 0 and
-                    n[2] * n[4] * n[6] == 0):
-                    changing1.append((x, y))
-        for x, y in changing1:
-            img[x, y] = 0
-        changing2 = []
-        for x in range(1, rows - 1):
-            for y in range(1, cols - 1):
-                if img[x, y] != 1:
-                    continue
-                n = neighbours(x, y, img)
-                n_sum = sum(n)
-                if (2 <= n_sum <= 6 and
-                    transitions(n) == 1 and
-                    n[0] * n[2] * n[6] == 0 and
-                    n[0] * n[4] * n[6] == 0):
-                    changing2.append((x, y))
-        for x, y in changing2:
-            img[x, y] = 0
-        changing1 = bool(changing1)
-        changing2 = bool(changing2)
+    if rows < 3 or cols < 3:
+        return img
+    flat = img.reshape(-1)
+    offsets = np.array([dr * cols + dc for dr, dc in _NEIGHBOUR_OFFSETS])
+    block = np.concatenate(([0], offsets))
+    weights = 1 << np.arange(8)
+
+    interior = np.zeros((rows, cols), dtype=bool)
+    interior[1:-1, 1:-1] = True
+    foreground = np.flatnonzero(interior.reshape(-1) & (flat == 1))
+    candidates = foreground
+    previous = np.empty(0, dtype=np.intp)
+    sub_iteration = 0
+    while len(candidates):
+        table = _ZHANG_SUEN_TABLES[sub_iteration % 2]
+        candidates = candidates[flat[candidates] == 1]
+        codes = (flat[candidates[:, None] + offsets] == 1).astype(np.intp) @ weights
+        deleted = candidates[table[codes]]
+        flat[deleted] = 0
+
+        if sub_iteration == 0:
+            # The second sub-iteration has not tested any pixel yet
+            candidates = foreground
+        else:
+            # Pixels around this and the previous sub-iteration's deletions
+            changed = np.concatenate((previous, deleted))
+            touched = np.sort((changed[:, None] + block).reshape(-1))
+            touched = touched[np.diff(touched, prepend=-1) != 0]
+            r, c = np.divmod(touched, cols)
+            candidates = touched[(r >= 1) & (r < rows - 1) & (c >= 1) & (c < cols - 1)]
+        previous = deleted
+        sub_iteration += 1
     return img
 
-def kolam_png_to_svg(image_path, svg_path="kolam.svg", scale=1.0, min_stroke_width=1.0, use_ai_segmentation=False, model_path=None):
-    # Step 1: Read the image in grayscale
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        raise FileNotFoundError(f"Image not found: {image_path}")
+# Overlap between tiles in tiled mode. It must exceed the reach of every
+# stage: blur and threshold (7 px), half the widest stroke (distance map and
+# thinning) and the largest dot (area <= 800 at inertia ratio >= 0.1 spans
+# under 30 px from its centre), so that tile cores match a whole-image run.
+TILE_HALO = 48
 
-    h, w = img.shape
+def _binarize(blurred):
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY_INV, 11, 2)
 
+def _segment(img, use_ai_segmentation=False, model_path=None, segmenter=None):
+    """Binary stroke mask (255 = stroke) of a grayscale scan"""
     # Step 2: Apply Gaussian blur to reduce noise
     blurred = cv2.GaussianBlur(img, (5, 5), 0)
 
     if use_ai_segmentation:
         # Step 3-AI: Use AI (Simple U-Net) for segmentation if enabled
         # Note: This requires a pretrained model; load from model_path
-        if model_path is None:
-            raise ValueError("Model path required for AI segmentation")
-        model = SimpleUNet()
-        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-        model.eval()
-
-        # Preprocess for model
-        transform = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Resize((256, 256)),  # Resize for model input; adjust as needed
-            transforms.Normalize(mean=[0.5], std=[0.5])
-        ])
-        pil_img = Image.fromarray(blurred)
-        input_tensor = transform(pil_img).unsqueeze(0)  # Add batch dim
-
-        # Inference
-        with torch.no_grad():
-            output = model(input_tensor)
-        mask = output.squeeze().cpu().numpy() > 0.5  # Binary mask
-        mask = cv2.resize((mask * 255).astype(np.uint8), (w, h))  # Resize back
-        thresh = mask
+        if segmenter is None:
+            if model_path is None:
+                raise ValueError("Model path required for AI segmentation")
+            segmenter = get_segmenter(model_path)
+        thresh = segmenter(blurred)
     else:
         # Step 3: Adaptive thresholding (non-AI fallback)
-        thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY_INV, 11, 2)
+        thresh = _binarize(blurred)
+    return thresh
 
+def _stroke_maps(thresh):
+    """Distance map, dots (x, y, size) and skeleton of a binary stroke mask"""
     # Step 4: Morphological closing to connect small gaps
     kernel = np.ones((3, 3), np.uint8)
     closing = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
@@ -154,7 +222,7 @@ def kolam_png_to_svg(image_path, svg_path="kolam.svg", scale=1.0, min_stroke_wid
     params.filterByCircularity = False
     detector = cv2.SimpleBlobDetector_create(params)
     keypoints = detector.detect(closing)
-    dots = [(int(k.pt[0]), int(k.pt[1])) for k in keypoints]
+    dots = [(k.pt[0], k.pt[1], k.size) for k in keypoints]
 
     # Step 6: Skeletonize strokes
     norm_closing = closing // 255
@@ -163,56 +231,347 @@ def kolam_png_to_svg(image_path, svg_path="kolam.svg", scale=1.0, min_stroke_wid
         skeleton = thinning(closing, thinningType=THINNING_ZHANGSUEN)
     except ImportError:
         skeleton = zhangSuen(norm_closing) * 255
+    return dist, dots, skeleton
 
-    # Step 7: Extract contours
-    contours, _ = cv2.findContours(skeleton, cv2.RETR_TREE, cv2.CHAIN_APPROX_NONE)
-
-    # Step 8: Create SVG
-    dwg = svgwrite.Drawing(svg_path, size=(w * scale, h * scale))
-
-    # Draw dots (adaptive radius)
-    for k in keypoints:
-        x, y = int(k.pt[0]), int(k.pt[1])
-        radius = max(1, k.size / 2 * scale)
-        dwg.add(dwg.circle(center=(x * scale, y * scale), r=radius, fill="black"))
-
-    # Draw strokes with adaptive smoothing and stroke width
-    for cnt in contours:
-        if len(cnt) < 5:
-            continue
-
-        # Compute average thickness
-        total_dist = 0.0
-        count = 0
-        for i in range(0, len(cnt), 5):  # Sample every 5th point for efficiency
-            x, y = cnt[i][0]
-            total_dist += dist[y, x]
-            count += 1
-        avg_dist = total_dist / count if count > 0 else 1.0
-        avg_thickness = 2 * avg_dist
-
-        # Boost if thin
-        if avg_thickness < 3.0:
-            avg_thickness *= 1.5
-
-        # Dynamic epsilon
-        arc_length = cv2.arcLength(cnt, False)
-        epsilon = 0.001 * arc_length
-        approx = cv2.approxPolyDP(cnt, epsilon, False)
-        points = [(int(p[0][0] * scale), int(p[0][1] * scale)) for p in approx]
-
-        # Adaptive stroke width
-        stroke_width = max(min_stroke_width, avg_thickness * scale)
-        dwg.add(dwg.polyline(points=points, stroke="black",
-                             fill="none", stroke_width=str(stroke_width)))
+# Tiled processing of large scans
+class _SparseMap:
+    """Values of an image at a few pixels, indexed like the dense array (0 elsewhere)"""
+
+    def __init__(self, shape, ys, xs, values):
+        self.shape = shape
+        flat = np.asarray(ys, dtype=np.int64) * shape[1] + xs
+        order = np.argsort(flat)
+        self.flat = flat[order]
+        self.values = np.asarray(values)[order]
+
+    def __getitem__(self, index):
+        y, x = index
+        flat = np.asarray(y, dtype=np.int64) * self.shape[1] + np.asarray(x, dtype=np.int64)
+        if len(self.flat) == 0:
+            return np.zeros(flat.shape, dtype=np.float32)[()]
+        pos = np.minimum(np.searchsorted(self.flat, flat), len(self.flat) - 1)
+        return np.where(self.flat[pos] == flat, self.values[pos], 0).astype(self.values.dtype)[()]
+
+def _process_tile(tile, core, is_mask):
+    """Run the stroke stages on one padded tile (worker side).
+
+    core is (y0, y1, x0, x1) within the tile. Returns the core of the
+    skeleton, the distance map at its skeleton pixels and the dots centred
+    in the core, in tile coordinates.
+    """
+    thresh = tile if is_mask else _binarize(cv2.GaussianBlur(tile, (5, 5), 0))
+    dist, dots, skeleton = _stroke_maps(thresh)
+    y0, y1, x0, x1 = core
+    skeleton = skeleton[y0:y1, x0:x1].copy()
+    ys, xs = np.nonzero(skeleton)
+    widths = dist[y0:y1, x0:x1][ys, xs]
+    dots = [d for d in dots if x0 <= d[0] < x1 and y0 <= d[1] < y1]
+    return skeleton, (ys, xs, widths), dots
+
+def _tiles(shape, tile_size, halo):
+    """(padded box, core box within it) for each tile of a grid"""
+    h, w = shape
+    for ty in range(0, h, tile_size):
+        for tx in range(0, w, tile_size):
+            y0, x0 = max(0, ty - halo), max(0, tx - halo)
+            y1, x1 = min(h, ty + tile_size + halo), min(w, tx + tile_size + halo)
+            core = (ty - y0, min(h, ty + tile_size) - y0, tx - x0, min(w, tx + tile_size) - x0)
+            yield (y0, y1, x0, x1), core
+
+def _tiled_stroke_maps(image, is_mask, tile_size, halo=TILE_HALO, workers=None):
+    """_stroke_maps over overlapping tiles spread across a process pool.
+
+    Tile cores are stitched into one skeleton, so contours traced on it
+    have no seams. The distance map comes back as a _SparseMap over the
+    skeleton pixels, and at most two tiles per worker are in flight, so
+    only the input and the skeleton are image-sized.
+    """
+    h, w = image.shape
+    skeleton = np.zeros((h, w), dtype=np.uint8)
+    all_ys, all_xs, all_widths, dots = [], [], [], []
+
+    def collect(boxes, result):
+        (y0, _, x0, _), (core_y0, _, core_x0, _) = boxes
+        tile_skeleton, (ys, xs, widths), tile_dots = result
+        oy, ox = y0 + core_y0, x0 + core_x0
+        skeleton[oy:oy + tile_skeleton.shape[0], ox:ox + tile_skeleton.shape[1]] = tile_skeleton
+        all_ys.append(ys + oy)
+        all_xs.append(xs + ox)
+        all_widths.append(widths)
+        dots.extend((x + x0, y + y0, size) for x, y, size in tile_dots)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for box, core in _tiles((h, w), tile_size, halo):
+            y0, y1, x0, x1 = box
+            pending.append(((box, core), pool.submit(_process_tile, image[y0:y1, x0:x1], core, is_mask)))
+            if len(pending) >= 2 * workers:
+                boxes, future = pending.pop(0)
+                collect(boxes, future.result())
+        for boxes, future in pending:
+            collect(boxes, future.result())
+
+    dist = _SparseMap((h, w), np.concatenate(all_ys), np.concatenate(all_xs), np.concatenate(all_widths))
+    return dist, dots, skeleton
 
+def _stroke_thickness(contours, dist):
+    """Stroke thickness (float32) of each (N,2) contour from the distance map.
+
+    Every 5th point of each contour is sampled; the samples of all
+    contours are looked up in one indexing pass and summed per contour.
+    """
+    if not contours:
+        return np.empty(0, dtype=np.float32)
+    lengths = np.array([len(cnt) for cnt in contours])
+    first = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(contours)
+    # Sample every 5th point of each contour
+    sampled = (np.arange(len(points)) - np.repeat(first, lengths)) % 5 == 0
+    points = points[sampled]
+    samples = np.asarray(dist[points[:, 1], points[:, 0]], dtype=np.float32)
+    counts = (lengths + 4) // 5
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    avg_thickness = 2 * np.add.reduceat(samples, starts) / counts.astype(np.float32)
+    # Boost if thin
+    return np.where(avg_thickness < 3.0, avg_thickness * np.float32(1.5), avg_thickness)
+
+# Skeleton graph: every stroke between two junctions or ends, walked once
+MIN_STROKE_PIXELS = 4    # Skeleton specks smaller than this are dropped
+
+# 8-neighbours as (row, col) offsets: the straight ones, then the diagonals
+_GRAPH_STEPS = ((-1, 0), (0, 1), (1, 0), (0, -1), (-1, 1), (1, 1), (1, -1), (-1, -1))
+
+def _skeleton_links(on):
+    """Pixel indices of the skeleton pixels and their (N,8) neighbours, -1 for none.
+
+    on is the skeleton padded by one pixel. A diagonal step is left out
+    when a straight pixel fills its corner, so staircases become simple
+    chains instead of clusters of pseudo-junctions.
+    """
+    w = on.shape[1]
+    flat = on.ravel()
+    pixels = np.flatnonzero(flat)
+    links = np.full((len(pixels), 8), -1, dtype=np.int64)
+    for k, (dy, dx) in enumerate(_GRAPH_STEPS):
+        neighbour = pixels + dy * w + dx
+        linked = flat[neighbour]
+        if dy and dx:
+            linked &= ~flat[pixels + dy * w] & ~flat[pixels + dx]
+        links[linked, k] = np.searchsorted(pixels, neighbour[linked])
+    return pixels, links
+
+def _skeleton_components(links):
+    """Connected component of each skeleton pixel, numbered in raster order of their first pixel.
+
+    Union-find over the links rather than a label image of the whole
+    skeleton: every round hooks the higher root of each linked pair onto
+    the lower, then jumps pointers until each pixel points at its root,
+    the lowest pixel of its component.
+    """
+    parent = np.arange(len(links))
+    u = np.repeat(parent, links.shape[1]).reshape(links.shape)
+    forward = links > u
+    u, v = u[forward], links[forward]
+    while len(u):
+        ru, rv = parent[u], parent[v]
+        np.minimum.at(parent, np.maximum(ru, rv), np.minimum(ru, rv))
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        apart = parent[u] != parent[v]
+        u, v = u[apart], v[apart]
+    return np.unique(parent, return_inverse=True)[1]
+
+def _walk(prev, cur, is_node, ahead, behind, stop):
+    """Walk chains of degree-2 pixels in parallel until each reaches a node or its stop pixel.
+
+    Returns the pixels of every walk, from prev to the pixel it ended on, as
+    one array plus the walk lengths.
+    """
+    walkers = np.arange(len(cur))
+    steps = [(walkers, prev)]
+    while len(cur):
+        steps.append((walkers, cur))
+        going = ~is_node[cur] & (cur != stop)
+        walkers, prev, cur, stop = walkers[going], prev[going], cur[going], stop[going]
+        nxt = np.where(ahead[cur] != prev, ahead[cur], behind[cur])
+        prev, cur = cur, nxt
+    owner = np.concatenate([s[0] for s in steps])
+    order = np.argsort(owner, kind="stable")
+    return np.concatenate([s[1] for s in steps])[order], np.bincount(owner, minlength=len(steps[0][0]))
+
+def _skeleton_strokes(skeleton):
+    """Polylines of a 1-pixel skeleton, one per edge of its pixel graph.
+
+    Junction (3+ neighbours) and end pixels are the nodes; each chain of
+    pixels between two nodes becomes one (N,2) polyline of (x, y) pixels
+    ending on both nodes, and each loop without nodes one closed polyline.
+    Unlike contours of the skeleton, no stroke is traced twice. Returns
+    the polylines and the connected component each belongs to.
+    """
+    on = np.pad(skeleton > 0, 1)
+    pixels, links = _skeleton_links(on)
+    component = _skeleton_components(links)
+    size = np.bincount(component)
+    is_node = np.count_nonzero(links >= 0, axis=1) != 2
+    # The two neighbours of each chain pixel
+    ahead, behind = np.sort(links, axis=1)[:, :-3:-1].T
+
+    # Walk out of every node along each of its links; each edge gets walked
+    # from both ends, so keep the walk that starts on the lower (pixel, step)
+    node, k = np.nonzero(is_node[:, None] & (links >= 0))
+    first = links[node, k]
+    path, lengths = _walk(node, first, is_node, ahead, behind, np.full(len(node), -1))
+    last = np.cumsum(lengths) - 1
+    keep = (node < path[last]) | ((node == path[last]) & (first <= path[last - 1]))
+    walks = [(path, lengths, keep)]
+
+    # A loop without nodes is a whole component: start on its first pixel
+    # and walk back round to it
+    seen = np.zeros(len(pixels), dtype=bool)
+    seen[path] = True
+    loose = np.flatnonzero(~seen & ~is_node)
+    if len(loose):
+        _, start = np.unique(component[loose], return_index=True)
+        start = loose[start]
+        path, lengths = _walk(start, ahead[start], is_node, ahead, behind, start)
+        walks.append((path, lengths, np.ones(len(start), dtype=bool)))
+
+    # Drop specks; x, y back in unpadded pixels
+    w = on.shape[1]
+    xy = np.column_stack((pixels % w - 1, pixels // w - 1)).astype(np.int32)
+    strokes, components = [], []
+    for path, lengths, keep in walks:
+        ends = np.cumsum(lengths)
+        keep &= size[component[path[ends - 1]]] >= MIN_STROKE_PIXELS
+        points = xy[path]
+        strokes += [points[a:b] for a, b in zip((ends - lengths)[keep].tolist(), ends[keep].tolist())]
+        components.append(component[path[ends - 1]][keep])
+    return strokes, np.concatenate(components)
+
+def _read_grayscale(image_path):
+    # Step 1: Read the image in grayscale
+    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise FileNotFoundError(f"Image not found: {image_path}")
+    return img
+
+def _contours(dist, dots, skeleton):
+    """Shape, dots, stroke polylines and their thickness from the stroke maps"""
+    # Step 7: Extract strokes as the edges of the skeleton graph
+    contours, components = _skeleton_strokes(skeleton)
+    return {"shape": skeleton.shape, "dots": dots, "contours": contours, "components": components,
+            "thickness": _stroke_thickness(contours, dist)}
+
+def vectorize_kolam(image_path, scale=1.0, min_stroke_width=1.0, use_ai_segmentation=False, model_path=None,
+                    tile_size=None, workers=None, segmenter=None, cache=None):
+    """Vectorize a kolam scan into dots and stroke polylines, in memory.
+
+    Returns a dict with the drawing size, dots as (cx, cy, radius) and
+    strokes as (N,2) float arrays with their widths, all scaled by scale.
+    With tile_size set, steps 2-6 run on overlapping tiles of that many
+    pixels in a pool of workers processes (all CPUs by default), which
+    bounds their memory by the tile rather than the scan. segmenter is a
+    UNetSegmenter to use instead of the one cached for model_path.
+
+    With a stage_cache.StageCache, the mask, contours and strokes are
+    looked up by the image's contents and the options they depend on;
+    "key" in the result is the key of the strokes.
+    """
+    cache = cache or NO_CACHE
+    image_key = cache.file_key(image_path)
+    if use_ai_segmentation:
+        unet = segmenter or (model_path and get_segmenter(model_path))
+        if not unet:
+            raise ValueError("Model path required for AI segmentation")
+        method = ("unet", cache.file_key(unet.model_path), unet.tile, unet.overlap)
+    else:
+        method = ("adaptive",)
+    mask_parts = (image_key,) + method
+
+    def mask():
+        return _segment(_read_grayscale(image_path), use_ai_segmentation, model_path, segmenter)
+
+    def contours():
+        if tile_size and not use_ai_segmentation:
+            maps = _tiled_stroke_maps(_read_grayscale(image_path), False, tile_size, workers=workers)
+        else:
+            _, thresh = cache.stage("mask", mask_parts, mask)
+            if tile_size:
+                # The model sees the whole image; the later stages are tiled
+                maps = _tiled_stroke_maps(thresh, True, tile_size, workers=workers)
+            else:
+                maps = _stroke_maps(thresh)
+        return _contours(*maps)
+
+    def strokes():
+        # Dots (adaptive radius), centred on their pixel; strokes with
+        # adaptive smoothing
+        _, traced = cache.stage("contours", contours_parts, contours)
+        h, w = traced["shape"]
+        dots = [(int(x) * scale, int(y) * scale, max(1, size / 2 * scale)) for x, y, size in traced["dots"]]
+        # Dynamic epsilon, from the length of the whole connected stroke
+        # (out and back, as a contour of it would run) rather than the edge
+        lengths = [cv2.arcLength(cnt, False) for cnt in traced["contours"]]
+        components = traced["components"]
+        epsilons = 0.002 * np.bincount(components, lengths)[components] if lengths else []
+        # Edges round a small loop between two junctions can simplify to the
+        # same chord; both run from the lower node, so an exact match finds them
+        strokes, seen, kept = [], set(), []
+        for k, (cnt, epsilon) in enumerate(zip(traced["contours"], epsilons)):
+            approx = cv2.approxPolyDP(cnt, float(epsilon), False).reshape(-1, 2)
+            if approx.tobytes() not in seen:
+                seen.add(approx.tobytes())
+                strokes.append(approx * float(scale))
+                kept.append(k)
+        return {"size": (w * scale, h * scale), "dots": dots, "strokes": strokes,
+                "thickness": traced["thickness"][kept]}
+
+    # The mask key stands for the mask even when tiling never builds it whole
+    contours_parts = (cache.key("mask", *mask_parts), "skeleton-graph")
+    key, kolam = cache.stage("strokes", (cache.key("contours", *contours_parts), scale), strokes)
+    # Adaptive stroke width; it only affects the SVG, so it is not part of the key
+    widths = np.maximum(np.float32(min_stroke_width), kolam["thickness"] * np.float32(scale))
+    return dict(kolam, widths=widths, key=key)
+
+def write_kolam_svg(kolam, svg_path):
+    """Write the dots and strokes of vectorize_kolam() as an SVG"""
+    # Step 8: Create SVG (attribute validation off: it dominates large drawings)
+    dwg = svgwrite.Drawing(svg_path, size=kolam["size"], debug=False)
+    for x, y, radius in kolam["dots"]:
+        dwg.add(dwg.circle(center=(x, y), r=radius, fill="black"))
+    for points, stroke_width in zip(kolam["strokes"], kolam["widths"]):
+        dwg.add(dwg.polyline(points=points.astype(int).tolist(), stroke="black",
+                             fill="none", stroke_width=str(stroke_width)))
     dwg.save()
+
+def kolam_png_to_svg(image_path, svg_path="kolam.svg", scale=1.0, min_stroke_width=1.0, use_ai_segmentation=False, model_path=None,
+                     tile_size=None, workers=None, segmenter=None, cache=None):
+    """Vectorize a kolam scan into an SVG of dots and stroke polylines.
+
+    Takes the options of vectorize_kolam(). Returns the number of dots
+    and strokes written.
+    """
+    kolam = vectorize_kolam(image_path, scale, min_stroke_width, use_ai_segmentation, model_path,
+                            tile_size=tile_size, workers=workers, segmenter=segmenter, cache=cache)
+    write_kolam_svg(kolam, svg_path)
     print(f"Enhanced SVG saved at {svg_path}")
+    return {"dots": len(kolam["dots"]), "strokes": len(kolam["strokes"])}
 
 # Example usage:
 # Save this code as kolam_converter_ai.py
-# Install required libraries: pip install opencv-python svgwrite numpy torch torchvision pillow
+# Install required libraries: pip install opencv-python svgwrite numpy torch
 # For AI: Train or obtain a pretrained U-Net model and save as 'unet_model.pth'
 # Run: python kolam_converter_ai.py
 # kolam_png_to_svg("kolam.png", "kolam.svg", scale=1.5, min_stroke_width=1.0, use_ai_segmentation=True, model_path="unet_model.pth")
-kolam_png_to_svg("kolam.png", "kolam.svg", scale=1.5, min_stroke_width=1.0)
\ No newline at end of file
+# To reuse one model across many scans with explicit settings:
+# segmenter = UNetSegmenter("unet_model.pth", num_threads=4, torchscript=True)
+# kolam_png_to_svg("kolam.png", "kolam.svg", use_ai_segmentation=True, segmenter=segmenter)
+# For large scans: kolam_png_to_svg("scan.png", "scan.svg", tile_size=2048)
+# Straight to G-code, without the SVG round trip: see app.png_to_gcode
+# To reuse stage results across runs: kolam_png_to_svg("kolam.png", "kolam.svg", cache=StageCache())
+if __name__ == "__main__":
+    kolam_png_to_svg("kolam.png", "kolam.svg", scale=1.5, min_stroke_width=1.0)
@@ -0,0 +1,179 @@
+# job_stats.py
+# Headless motion statistics and cycle-time estimate for a parsed G-code
+# program, computed over whole columns with NumPy instead of replaying it
+# Requirements: pip install numpy
+
+import sys
+import numpy as np
+
+from gcode_parser import load_gcode
+from gcode_writer import FEED_RATE, PLUNGE_RATE, SAFE_HEIGHT
+
+RAPID_RATE = 3000           # G0 speed (mm/min)
+ACCELERATION = 500.0        # Acceleration of every axis (mm/s^2)
+JUNCTION_DEVIATION = 0.01   # Cornering tolerance (mm), as in grbl
+HISTOGRAM_BINS = 20         # Log-spaced bins of the segment-length histogram
+
+# -------------------------------
+# MOVE GEOMETRY
+# -------------------------------
+def _code_mask(program, *names):
+    return np.isin(program.codes, [program.code_id(name) for name in names])
+
+def _forward_fill(values, default):
+    """Carry the last non-NaN value forward, default before the first"""
+    present = ~np.isnan(values)
+    last = np.maximum.accumulate(np.where(present, np.arange(len(values)), -1))
+    return np.where(last >= 0, values[np.maximum(last, 0)], default)
+
+def arc_sweep(start, end, centre, clockwise):
+    """Swept angle (radians, 0..2pi] of G2/G3 arcs; equal ends make a full circle"""
+    a0 = np.arctan2(start[:, 1] - centre[:, 1], start[:, 0] - centre[:, 0])
+    a1 = np.arctan2(end[:, 1] - centre[:, 1], end[:, 0] - centre[:, 0])
+    sweep = np.where(clockwise, a0 - a1, a1 - a0) % (2 * np.pi)
+    return np.where(sweep > 0, sweep, 2 * np.pi)
+
+def _norm(vectors):
+    # Column by column: reductions along a short axis are slow in NumPy
+    return np.sqrt(sum(vectors[:, k] ** 2 for k in range(vectors.shape[1])))
+
+def _unit(vectors):
+    norm = _norm(vectors)
+    return vectors / np.where(norm > 0, norm, 1.0)[:, None]
+
+# -------------------------------
+# TRAPEZOIDAL TIME MODEL
+# -------------------------------
+def _junction_speeds(exit_dir, entry_dir, speed, length, acceleration, deviation):
+    """Speed (mm/s) at each junction between consecutive moves.
+
+    The corner limit is grbl's junction deviation formula. A junction is
+    also capped at what either neighbour can reach from a standstill, so
+    every move can still accelerate or brake within its own length.
+    """
+    dot = sum(exit_dir[:-1, k] * entry_dir[1:, k] for k in range(exit_dir.shape[1]))
+    cos_theta = np.clip(-dot, -1.0, 1.0)
+    sin_half = np.sqrt(0.5 * (1.0 - cos_theta))
+    with np.errstate(divide="ignore"):
+        corner = np.sqrt(acceleration * deviation * sin_half / (1.0 - sin_half))
+    reach = np.sqrt(2 * acceleration * np.minimum(length[:-1], length[1:]))
+    inner = np.minimum(np.minimum(speed[:-1], speed[1:]), np.minimum(corner, reach))
+    return np.concatenate(([0.0], inner, [0.0]))
+
+def _trapezoid_times(length, speed, entry, exit, acceleration):
+    """Time (s) to run each move from entry to exit speed, cruising at speed"""
+    ramp = (2 * speed ** 2 - entry ** 2 - exit ** 2) / (2 * acceleration)
+    cruise = ramp <= length
+    peak = np.where(cruise, speed, np.sqrt(acceleration * length + 0.5 * (entry ** 2 + exit ** 2)))
+    accel_time = (2 * peak - entry - exit) / acceleration
+    cruise_time = np.where(cruise, (length - ramp) / speed, 0.0)
+    return accel_time + cruise_time
+
+# -------------------------------
+# STATISTICS
+# -------------------------------
+def _bounds(x, y):
+    if len(x) == 0:
+        return None
+    return (float(x.min()), float(y.min()), float(x.max()), float(y.max()))
+
+def job_stats(program, feed=FEED_RATE, plunge_rate=PLUNGE_RATE, rapid_rate=RAPID_RATE,
+              acceleration=ACCELERATION, junction_deviation=JUNCTION_DEVIATION,
+              bins=HISTOGRAM_BINS, start=(0.0, 0.0, SAFE_HEIGHT)):
+    """Lengths, counts, bounds and estimated cycle time of a GCodeProgram.
+
+    Feed moves run at the modal F word (feed until one is given), with Z
+    travel held to plunge_rate; rapids run at rapid_rate. Every axis
+    accelerates at acceleration, so each move is a trapezoid (or triangle)
+    between junction speeds.
+    """
+    positions = program.positions(start=start)
+    previous = np.vstack((np.asarray(start, dtype=float)[None], positions[:-1]))
+    delta = positions - previous
+    dz = np.abs(delta[:, 2])
+
+    rapid = _code_mask(program, "G0", "G00")
+    linear = _code_mask(program, "G1", "G01")
+    clockwise = _code_mask(program, "G2", "G02")
+    arc = clockwise | _code_mask(program, "G3", "G03")
+
+    # Lines are straight in XYZ; arcs sweep about start + (I, J)
+    length = _norm(delta)
+    exit_dir = entry_dir = _unit(delta)
+    radius = np.zeros(len(positions))
+    if arc.any():
+        offset = np.column_stack((np.nan_to_num(program.word("I")), np.nan_to_num(program.word("J"))))
+        centre = previous[:, :2] + offset
+        radius = np.hypot(offset[:, 0], offset[:, 1])
+        sweep = arc_sweep(previous[:, :2], positions[:, :2], centre, clockwise)
+        length = np.where(arc, np.hypot(radius * sweep, dz), length)
+        # Tangents at the arc ends: the radius turned a quarter turn
+        turn = np.where(clockwise, -1.0, 1.0)[:, None]
+        tangent_in = np.column_stack((centre[:, 1] - previous[:, 1], previous[:, 0] - centre[:, 0], np.zeros(len(centre))))
+        tangent_out = np.column_stack((centre[:, 1] - positions[:, 1], positions[:, 0] - centre[:, 0], np.zeros(len(centre))))
+        entry_dir = np.where(arc[:, None], _unit(turn * tangent_in), entry_dir)
+        exit_dir = np.where(arc[:, None], _unit(turn * tangent_out), exit_dir)
+
+    moving = (rapid | linear | arc) & (length > 0)
+    feed_move = moving & (linear | arc)
+    rapid_move = moving & rapid
+    cutting = feed_move & (previous[:, 2] <= 0.0) & (positions[:, 2] <= 0.0)
+
+    # Speeds in mm/s, limited by Z rate on feed moves and, on arcs, centripetal acceleration
+    speed = np.where(rapid, rapid_rate, _forward_fill(program.word("F"), feed)) / 60.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where((dz > 0) & ~rapid, np.minimum(speed, plunge_rate / 60.0 * length / dz), speed)
+    speed = np.where(arc, np.minimum(speed, np.sqrt(acceleration * np.maximum(radius, 1e-9))), speed)
+
+    moves = np.flatnonzero(moving)
+    junction = _junction_speeds(exit_dir[moves], entry_dir[moves], speed[moves], length[moves],
+                                acceleration, junction_deviation)
+    times = _trapezoid_times(length[moves], speed[moves], junction[:-1], junction[1:], acceleration)
+
+    feed_lengths = length[feed_move]
+    histogram = None
+    if len(feed_lengths):
+        edges = np.geomspace(feed_lengths.min(), feed_lengths.max() * (1 + 1e-9), bins + 1)
+        histogram = np.histogram(feed_lengths, bins=edges)
+
+    z = positions[:, 2]
+    return {
+        "moves": len(moves),
+        "rapid_moves": int(np.count_nonzero(rapid_move)),
+        "feed_moves": int(np.count_nonzero(feed_move)),
+        "cut_length": float(length[cutting].sum()),
+        "feed_length": float(feed_lengths.sum()),
+        "rapid_length": float(length[rapid_move].sum()),
+        "z_cycles": int(np.count_nonzero((previous[:, 2] > 0.0) & (z <= 0.0))),
+        "bounds": _bounds(positions[moving, 0], positions[moving, 1]),
+        "cut_bounds": _bounds(np.concatenate((previous[cutting, 0], positions[cutting, 0])),
+                              np.concatenate((previous[cutting, 1], positions[cutting, 1]))),
+        "histogram": histogram,
+        "cycle_time": float(times.sum()),
+        "rapid_time": float(times[rapid_move[moves]].sum()),
+    }
+
+def format_stats(stats):
+    """Human-readable report of job_stats()"""
+    minutes, seconds = divmod(stats["cycle_time"], 60)
+    lines = [
+        f"Moves: {stats['moves']} ({stats['feed_moves']} feed, {stats['rapid_moves']} rapid)",
+        f"Cut length: {stats['cut_length']:.1f} mm",
+        f"Feed length: {stats['feed_length']:.1f} mm",
+        f"Rapid length: {stats['rapid_length']:.1f} mm",
+        f"Z cycles: {stats['z_cycles']}",
+        f"Bounds: {stats['bounds']}",
+        f"Cut bounds: {stats['cut_bounds']}",
+        f"Est. cycle time: {int(minutes)} min {seconds:.1f} s ({stats['rapid_time']:.1f} s rapid)",
+    ]
+    if stats["histogram"] is not None:
+        lines.append("Segment lengths (mm):")
+        counts, edges = stats["histogram"]
+        for count, low, high in zip(counts, edges[:-1], edges[1:]):
+            lines.append(f"  {low:9.3f} - {high:9.3f}: {count}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(path)
+        print(format_stats(job_stats(load_gcode(path))))
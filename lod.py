@@ -0,0 +1,179 @@
+# lod.py
+# Level-of-detail pyramid for previewing toolpaths: the pen-down polylines
+# are decimated once per zoom level and bucketed into square tiles, so a view
+# only touches the tiles it shows, at the detail its pixels can resolve
+# Requirements: pip install numpy
+
+import numpy as np
+
+from job_stats import arc_sweep
+from toolpath import simplify_polyline
+
+BASE_TOLERANCE = 0.005   # Decimation error of the finest level (mm)
+TILE_PIXELS = 256        # Tile edge in screen pixels at the zoom a level is used for
+MAX_TILE_SPAN = 64       # Pieces covering more tiles than this are always drawn
+ARC_TOLERANCE = 0.01     # Chord deviation of the polylines drawn for G2/G3 moves (mm)
+
+# -------------------------------
+# PEN-DOWN PATHS
+# -------------------------------
+def arc_points(positions, arc, clockwise, offsets, start=(0.0, 0.0, 5.0), tolerance=ARC_TOLERANCE):
+    """Points inside each G2/G3 move, as {command index: (K,2) array}.
+
+    arc marks the G2/G3 commands, clockwise the G2 ones, and offsets holds
+    their (N,2) I/J centre offsets. The points sit at equal angles so the
+    chords stay within tolerance of the arc; equal ends make a full circle.
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    moves = np.flatnonzero(arc)
+    if len(moves) == 0:
+        return {}
+    previous = np.vstack((np.asarray(start, dtype=float)[None], positions[:-1]))[moves, :2]
+    offsets = np.asarray(offsets, dtype=float)[moves]
+    clockwise = np.asarray(clockwise, dtype=bool)[moves]
+    centre = previous + offsets
+    radius = np.hypot(offsets[:, 0], offsets[:, 1])
+    sweep = arc_sweep(previous, positions[moves, :2], centre, clockwise)
+    # A chord spanning angle a on radius r deviates r * (1 - cos(a / 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_angle = 2 * np.arccos(1 - tolerance / radius)
+    counts = np.where(radius > tolerance, np.ceil(sweep / max_angle), 1).astype(int)
+    first = np.arctan2(previous[:, 1] - centre[:, 1], previous[:, 0] - centre[:, 0])
+    turn = np.where(clockwise, -sweep, sweep)
+    arcs = {}
+    for k in np.flatnonzero(counts > 1):
+        angle = first[k] + turn[k] * np.arange(1, counts[k]) / counts[k]
+        arcs[int(moves[k])] = np.column_stack((centre[k, 0] + radius[k] * np.cos(angle),
+                                               centre[k, 1] + radius[k] * np.sin(angle)))
+    return arcs
+
+def pen_down_paths(positions, feed, start=(0.0, 0.0, 5.0), arcs=None):
+    """Polylines a program draws, as (points (M,2), index (M,)) pairs.
+
+    positions holds the (N,3) machine position after each command and
+    feed marks the G1/G2/G3 moves; arcs (see arc_points) gives the points
+    inside each G2/G3 move. A move draws when it changes X/Y, or is an
+    arc, with Z at or below zero before or after it. index[k] is the
+    command that draws up to points[k], so a polyline can be cut off at
+    any command.
+    """
+    arcs = arcs or {}
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    previous = np.vstack((np.asarray(start, dtype=float)[None], positions[:-1]))
+    arc_moves = np.array(sorted(arcs), dtype=np.int64)
+    moved = np.any(positions[:, :2] != previous[:, :2], axis=1)
+    moved[arc_moves] = True
+    draw = (np.asarray(feed, dtype=bool)
+            & ((previous[:, 2] <= 0.0) | (positions[:, 2] <= 0.0))
+            & moved)
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], draw, [False])).astype(np.int8)))
+    paths = []
+    for first, last in zip(edges[0::2], edges[1::2]):
+        points = [previous[first:first + 1, :2]]
+        index = [np.array([first])]
+        cursor = first
+        lo, hi = np.searchsorted(arc_moves, (first, last))
+        for i in arc_moves[lo:hi]:
+            # Moves up to the arc, then the arc's inside and its end point
+            points += [positions[cursor:i, :2], arcs[i]]
+            index += [np.arange(cursor, i), np.full(len(arcs[i]), i)]
+            cursor = i
+        points.append(positions[cursor:last, :2])
+        index.append(np.arange(cursor, last))
+        paths.append((np.vstack(points), np.concatenate(index)))
+    return paths
+
+# -------------------------------
+# PYRAMID
+# -------------------------------
+class LodPyramid:
+    """Pen-down paths decimated per zoom level and indexed by tile.
+
+    Level L keeps every path within BASE_TOLERANCE * 2**L of the original
+    (level 0 is the raw points) and is built from level L-1 the first time
+    a view needs it. Its tiles are TILE_PIXELS screen pixels across at the
+    zoom it is used for. Built levels stay cached between frames.
+    """
+
+    def __init__(self, paths, base_tolerance=BASE_TOLERANCE, tile_pixels=TILE_PIXELS):
+        self.base_tolerance = base_tolerance
+        self.tile_pixels = tile_pixels
+        self._decimated = {0: list(paths)}
+        self._tiles = {}
+
+    def tolerance(self, level):
+        return self.base_tolerance * 2 ** level if level else 0.0
+
+    def level_for(self, scale):
+        """Coarsest level whose error stays under half a pixel at scale px/mm"""
+        half_pixel = 0.5 / scale
+        if half_pixel < 2 * self.base_tolerance:
+            return 0
+        return int(np.floor(np.log2(half_pixel / self.base_tolerance)))
+
+    def _paths(self, level):
+        paths = self._decimated.get(level)
+        if paths is None:
+            tolerance = self.tolerance(level)
+            paths = []
+            for points, index in self._paths(level - 1):
+                keep = simplify_polyline(points, tolerance)
+                paths.append((points[keep], index[keep]))
+            self._decimated[level] = paths
+        return paths
+
+    def _tile_size(self, level):
+        # A level is used at up to 1 / (2 * tolerance) px/mm
+        return self.tile_pixels * 2 * max(self.tolerance(level), self.base_tolerance)
+
+    def _index(self, level):
+        """{tile: [piece, ...]} plus the pieces too large to bucket"""
+        cached = self._tiles.get(level)
+        if cached is not None:
+            return cached
+        size = self._tile_size(level)
+        tiles, oversize = {}, []
+        for points, index in self._paths(level):
+            cells = np.floor(points / size).astype(np.int64)
+            # Cut where a path changes tile; each piece keeps the next point
+            # so the segment across the border is drawn
+            cuts = np.flatnonzero(np.any(cells[1:] != cells[:-1], axis=1)) + 1
+            bounds = np.concatenate(([0], cuts, [len(points) - 1]))
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                piece = (points[first:last + 1], index[first:last + 1])
+                low = cells[first:last + 1].min(axis=0)
+                high = cells[first:last + 1].max(axis=0)
+                if np.prod(high - low + 1) > MAX_TILE_SPAN:
+                    oversize.append(piece)
+                    continue
+                for tx in range(low[0], high[0] + 1):
+                    for ty in range(low[1], high[1] + 1):
+                        tiles.setdefault((tx, ty), []).append(piece)
+        self._tiles[level] = (tiles, oversize)
+        return tiles, oversize
+
+    def visible(self, bbox, scale, upto=None):
+        """Polylines to draw for the world box (min_x, min_y, max_x, max_y)
+        at scale px/mm, cut off before command upto"""
+        level = self.level_for(scale)
+        tiles, oversize = self._index(level)
+        size = self._tile_size(level)
+        low = np.floor(np.asarray(bbox[:2]) / size).astype(np.int64)
+        high = np.floor(np.asarray(bbox[2:]) / size).astype(np.int64)
+        pieces = {}
+        if (high - low + 1).prod() > len(tiles):
+            keys = [k for k in tiles if low[0] <= k[0] <= high[0] and low[1] <= k[1] <= high[1]]
+        else:
+            keys = [(tx, ty) for tx in range(low[0], high[0] + 1) for ty in range(low[1], high[1] + 1)]
+        for key in keys:
+            for piece in tiles.get(key, ()):
+                pieces[id(piece)] = piece
+        for piece in oversize:
+            pieces[id(piece)] = piece
+        lines = []
+        for points, index in pieces.values():
+            if upto is not None:
+                points = points[:np.searchsorted(index, upto)]
+            if len(points) >= 2:
+                lines.append(points)
+        return lines
@@ -0,0 +1,176 @@
+# sampling.py
+# Vectorized sampling of svgpathtools segments into (N,2) point arrays
+# Requirements: pip install numpy
+
+import numpy as np
+
+# -------------------------------
+# SEGMENT EVALUATION
+# -------------------------------
+def _line_points(seg, t):
+    distance = seg.end - seg.start
+    return seg.start + distance * t
+
+def _quadratic_points(seg, t):
+    tc = 1 - t
+    return tc * tc * seg.start + 2 * tc * t * seg.control + t * t * seg.end
+
+def _cubic_points(seg, t):
+    # Horner form of P0*(1-t)**3 + 3*P1*t*(1-t)**2 + 3*P2*(1-t)*t**2 + P3*t**3
+    return seg.start + t * (
+        3 * (seg.control1 - seg.start) + t * (
+            3 * (seg.start + seg.control2) - 6 * seg.control1 + t * (
+                -seg.start + 3 * (seg.control1 - seg.control2) + seg.end
+            )))
+
+def _arc_points(seg, t):
+    angle = np.radians(seg.theta + t * seg.delta)
+    cosphi = seg.rot_matrix.real
+    sinphi = seg.rot_matrix.imag
+    rx = seg.radius.real
+    ry = seg.radius.imag
+    x = rx * cosphi * np.cos(angle) - ry * sinphi * np.sin(angle) + seg.center.real
+    y = rx * sinphi * np.cos(angle) + ry * cosphi * np.sin(angle) + seg.center.imag
+    return x + 1j * y
+
+_EVALUATORS = {
+    "Line": _line_points,
+    "QuadraticBezier": _quadratic_points,
+    "CubicBezier": _cubic_points,
+    "Arc": _arc_points,
+}
+
+def segment_points(seg, t):
+    """Evaluate a segment at every parameter in t, returning complex points"""
+    t = np.asarray(t, dtype=float)
+    evaluate = _EVALUATORS.get(type(seg).__name__)
+    if evaluate is None:
+        # Unknown segment type: fall back to its own point()
+        return np.array([seg.point(v) for v in t], dtype=complex)
+    return np.asarray(evaluate(seg, t), dtype=complex)
+
+# -------------------------------
+# PATH SAMPLING
+# -------------------------------
+def sample_path(path, steps=100):
+    """Sample steps+1 points on every segment of a path as one (N,2) array"""
+    t = np.arange(steps + 1) / steps
+    if len(path) == 0:
+        return np.empty((0, 2))
+    samples = np.concatenate([segment_points(seg, t) for seg in path])
+    return np.column_stack((samples.real, samples.imag))
+
+# -------------------------------
+# ADAPTIVE SAMPLING
+# -------------------------------
+def _chord_deviation(p0, p1, probes):
+    """Distance of each probe point (complex) from the chord segment p0-p1"""
+    chord = p1 - p0
+    length_sq = np.abs(chord) ** 2
+    offset = probes - p0[:, None]
+    # Project onto the chord and clamp to its ends, so a curve that doubles
+    # back past an end is measured from that end rather than from the line
+    safe = np.where(length_sq > 0, length_sq, 1.0)
+    t = np.clip((np.conj(chord)[:, None] * offset).real / safe[:, None], 0.0, 1.0)
+    return np.abs(offset - t * chord[:, None])
+
+def arc_parameters(radius, delta, chord_tolerance):
+    """Parameters t of an arc sweeping delta degrees whose chords stay within chord_tolerance"""
+    if radius <= chord_tolerance:
+        return np.array([0.0, 1.0])
+    # A chord spanning angle a on radius r deviates r * (1 - cos(a / 2))
+    max_angle = 2 * np.arccos(1 - chord_tolerance / radius)
+    count = max(1, int(np.ceil(np.radians(abs(delta)) / max_angle)))
+    return np.linspace(0.0, 1.0, count + 1)
+
+def _arc_parameters(seg, chord_tolerance):
+    radius = max(abs(seg.radius.real), abs(seg.radius.imag))
+    return arc_parameters(radius, seg.delta, chord_tolerance)
+
+def adaptive_parameters(seg, chord_tolerance, max_depth=16):
+    """Parameters t at which the chords stay within chord_tolerance of seg"""
+    kind = type(seg).__name__
+    if kind == "Line":
+        return np.array([0.0, 1.0])
+    if kind == "Arc":
+        return _arc_parameters(seg, chord_tolerance)
+    probe_at = np.array([0.25, 0.5, 0.75])
+    t = np.array([0.0, 1.0])
+    for _ in range(max_depth):
+        t0, t1 = t[:-1], t[1:]
+        probes = t0[:, None] + (t1 - t0)[:, None] * probe_at
+        ends = segment_points(seg, t)
+        inner = segment_points(seg, probes.ravel()).reshape(probes.shape)
+        deviation = _chord_deviation(ends[:-1], ends[1:], inner).max(axis=1)
+        split = deviation > chord_tolerance
+        if not split.any():
+            break
+        t = np.sort(np.concatenate((t, (t0[split] + t1[split]) / 2)))
+    return t
+
+def sample_path_adaptive(path, chord_tolerance=0.05):
+    """Sample a path so no chord deviates more than chord_tolerance from it.
+
+    Straight segments contribute only their endpoints, curves are subdivided
+    only where their curvature needs it. The start of a segment is dropped
+    when it repeats the end of the previous one.
+    """
+    chunks = []
+    last = None
+    for seg in path:
+        samples = segment_points(seg, adaptive_parameters(seg, chord_tolerance))
+        if last is not None and samples[0] == last:
+            samples = samples[1:]
+        if len(samples):
+            chunks.append(samples)
+            last = samples[-1]
+    if not chunks:
+        return np.empty((0, 2))
+    samples = np.concatenate(chunks)
+    return np.column_stack((samples.real, samples.imag))
+
+def sample_circle(center, radius, chord_tolerance=None, steps=80):
+    """Sample a closed circle as an (N,2) array, starting and ending on its left.
+
+    It runs the way svgpathtools draws an SVG <circle>. With chord_tolerance
+    set, just enough points are used to stay within it; otherwise 2*steps.
+    """
+    if chord_tolerance is None:
+        count = 2 * steps
+    elif radius <= chord_tolerance:
+        count = 4
+    else:
+        max_angle = 2 * np.arccos(1 - chord_tolerance / radius)
+        count = max(4, int(np.ceil(2 * np.pi / max_angle)))
+    angle = np.pi - np.linspace(0.0, 2 * np.pi, count + 1)
+    return np.column_stack((center[0] + radius * np.cos(angle), center[1] + radius * np.sin(angle)))
+
+class PathSampler:
+    """Sample each path once and hand back the cached array on later calls.
+
+    With chord_tolerance set, paths are sampled adaptively instead of with a
+    fixed number of steps per segment. Shapes with a sample() method (see
+    svg_reader) sample themselves.
+    """
+
+    def __init__(self, steps=80, chord_tolerance=None):
+        self.steps = steps
+        self.chord_tolerance = chord_tolerance
+        self._cache = {}
+
+    def sample(self, path):
+        entry = self._cache.get(id(path))
+        if entry is None:
+            if hasattr(path, "sample"):
+                points = path.sample(self.steps, self.chord_tolerance)
+            elif self.chord_tolerance is None:
+                points = sample_path(path, steps=self.steps)
+            else:
+                points = sample_path_adaptive(path, self.chord_tolerance)
+            # Keep a reference to the path so its id cannot be reused
+            entry = (path, points)
+            self._cache[id(path)] = entry
+        return entry[1]
+
+    def clear(self):
+        self._cache.clear()
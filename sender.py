@@ -0,0 +1,476 @@
+# sender.py
+# Streams a .gcode file to a grbl-style controller over a serial device or
+# pty with character-counting flow control: lines go out while they fit in
+# the controller's RX buffer instead of one per "ok", so the planner stays
+# fed on dense programs. SimulatedController is a controller on a local
+# pty for measuring throughput, buffer occupancy and stalls without hardware
+# Requirements: POSIX (termios, pty); pip install pyserial on other platforms
+# Run: python sender.py kolam.gcode /dev/ttyUSB0 --baud 115200
+#      python sender.py kolam.gcode --simulate --speedup 20
+
+import argparse
+import collections
+import math
+import os
+import re
+import select
+import sys
+import threading
+import time
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = tty = None
+try:
+    import serial
+except ImportError:
+    serial = None
+
+from job_stats import RAPID_RATE
+from gcode_writer import FEED_RATE
+
+BAUD_RATE = 115200
+RX_BUFFER_SIZE = 128     # grbl's serial RX buffer (bytes)
+PLANNER_BLOCKS = 16      # grbl's planner buffer (motion blocks)
+RESPONSE_TIMEOUT = 30.0  # Longest the controller may go silent, or idle with lines unacknowledged (s)
+STATUS_INTERVAL = 1.0    # Status query ("?") interval while waiting for a response (s)
+WAKE_TIMEOUT = 2.0       # Longest to wait for the controller's startup banner (s)
+WAKE_SETTLE = 0.1        # Quiet time that ends the controller's answers to the wake-up (s)
+READ_SIZE = 4096
+
+# -------------------------------
+# PORTS
+# -------------------------------
+class FdPort:
+    """A tty file descriptor (serial device or pty) in raw mode"""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    @classmethod
+    def open(cls, device, baudrate=BAUD_RATE):
+        fd = os.open(device, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(fd)
+        attributes = termios.tcgetattr(fd)
+        speed = getattr(termios, f"B{baudrate}", None)
+        if speed is not None:
+            attributes[4] = attributes[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attributes)
+        return cls(fd)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            select.select([], [self.fd], [])
+            view = view[os.write(self.fd, view):]
+
+    def read(self, timeout):
+        """Bytes available within timeout seconds, b"" if none arrived"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return os.read(self.fd, READ_SIZE) if ready else b""
+
+    def flush_input(self):
+        """Discard anything received but not yet read"""
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+
+    def close(self):
+        os.close(self.fd)
+
+class SerialPort:
+    """A pyserial port with FdPort's interface"""
+
+    def __init__(self, device, baudrate=BAUD_RATE):
+        self.port = serial.Serial(device, baudrate)
+
+    def write(self, data):
+        self.port.write(data)
+
+    def read(self, timeout):
+        self.port.timeout = timeout
+        return self.port.read(max(1, self.port.in_waiting))
+
+    def flush_input(self):
+        self.port.reset_input_buffer()
+
+    def close(self):
+        self.port.close()
+
+def open_port(device, baudrate=BAUD_RATE):
+    """Open a serial device or pty: directly on POSIX, through pyserial elsewhere"""
+    if termios is not None:
+        return FdPort.open(device, baudrate)
+    if serial is None:
+        raise RuntimeError("pyserial is required to open serial ports on this platform")
+    return SerialPort(device, baudrate)
+
+# -------------------------------
+# STREAMING
+# -------------------------------
+_COMMENT = re.compile(rb"\([^)]*\)|;.*")
+_SPACE = re.compile(rb"\s+")
+_BANNER = re.compile(rb"Grbl \S+")
+
+def wake_controller(port, timeout=WAKE_TIMEOUT, log=sys.stdout):
+    """Wake the controller and wait until it is ready; returns its banner, or None.
+
+    grbl resets when its port is opened and prints a "Grbl x.x" banner once
+    it is up; lines sent before then are lost. The blank lines that wake it
+    are answered with "ok"s a stream would take for acknowledgements, so
+    after the banner (or timeout seconds without one) the port is left to
+    go quiet and everything received is discarded.
+    """
+    port.write(b"\r\n\r\n")
+    received, banner = b"", None
+    deadline = time.perf_counter() + timeout
+    while banner is None and time.perf_counter() < deadline:
+        received += port.read(max(0.0, deadline - time.perf_counter()))
+        match = _BANNER.search(received)
+        if match and b"\n" in received[match.end():]:
+            banner = received[match.start():].split(b"\n", 1)[0].strip().decode(errors="replace")
+    settled = time.perf_counter() + timeout
+    while port.read(WAKE_SETTLE) and time.perf_counter() < settled:
+        pass
+    port.flush_input()
+    if banner:
+        print(banner, file=log)
+    return banner
+
+def program_lines(path, compact=True):
+    """Lines of a .gcode file to send, as bytes without comments or newlines.
+
+    With compact, whitespace inside lines is dropped too (grbl ignores it),
+    which leaves more of the RX buffer for commands.
+    """
+    with open(path, "rb") as f:
+        for raw in f:
+            line = _COMMENT.sub(b"", raw).strip()
+            if compact:
+                line = _SPACE.sub(b"", line)
+            if line:
+                yield line
+
+def stream_gcode(port, lines, rx_size=RX_BUFFER_SIZE, ping_pong=False,
+                 timeout=RESPONSE_TIMEOUT, log=sys.stdout):
+    """Send lines (bytes, no newline) to a controller with character counting.
+
+    A line is written as soon as it fits in rx_size together with the lines
+    still waiting for their "ok" or "error:"; each response frees the
+    oldest. ping_pong waits for every response instead, as simple senders
+    do. Other controller messages go to log; an ALARM aborts the stream.
+
+    An "ok" may rightly take as long as the planner needs to free a block,
+    so while waiting the controller is asked for its status every
+    STATUS_INTERVAL. TimeoutError is raised only after timeout seconds
+    without an answer, or reporting Idle with lines still unacknowledged.
+    Returns line and byte counts, timings, RX buffer occupancy and errors.
+    """
+    in_flight = collections.deque()   # Unacknowledged lines, oldest first
+    buffered = 0                       # Bytes of them in the RX buffer
+    received = b""
+    stats = {"lines": 0, "bytes": 0, "errors": [], "blocked_seconds": 0.0, "max_in_flight": 0}
+    occupancy = 0.0                    # Integral of buffered over time
+    lines = iter(lines)
+    line = next(lines, None)
+
+    started = last = progress = queried = time.perf_counter()
+    while line is not None or in_flight:
+        # Fill the RX buffer as far as the next line allows
+        batch = []
+        while line is not None and not (ping_pong and in_flight):
+            size = len(line) + 1
+            if size > rx_size:
+                raise ValueError(f"Line longer than the RX buffer: {line.decode(errors='replace')}")
+            if buffered + size > rx_size:
+                break
+            batch.append(line + b"\n")
+            in_flight.append((stats["lines"], line))
+            buffered += size
+            stats["lines"] += 1
+            stats["bytes"] += size
+            line = next(lines, None)
+        if batch:
+            port.write(b"".join(batch))
+            stats["max_in_flight"] = max(stats["max_in_flight"], buffered)
+
+        # Wait for responses; the buffer is full or the program all sent
+        waited = time.perf_counter()
+        data = port.read(STATUS_INTERVAL)
+        now = time.perf_counter()
+        if line is not None:
+            stats["blocked_seconds"] += now - waited
+        occupancy += buffered * (now - last)
+        last = now
+        if not data:
+            if now - progress > timeout:
+                raise TimeoutError(f"No progress within {timeout} s, {len(in_flight)} lines unacknowledged")
+            if now - queried >= STATUS_INTERVAL:
+                # Real-time command: answered at once, takes no RX buffer space
+                port.write(b"?")
+                queried = now
+            continue
+
+        *responses, received = (received + data).split(b"\n")
+        for response in responses:
+            response = response.strip().decode(errors="replace")
+            if response.startswith("<"):
+                # Status report: still busy unless it is idle
+                if not response.startswith("<Idle"):
+                    progress = now
+            elif response == "ok" or response.startswith("error"):
+                progress = now
+                if not in_flight:
+                    continue
+                index, sent = in_flight.popleft()
+                buffered -= len(sent) + 1
+                if response != "ok":
+                    stats["errors"].append((index, sent.decode(errors="replace"), response))
+                    print(f"Line {index} {sent.decode(errors='replace')}: {response}", file=log)
+            elif response.startswith("ALARM"):
+                raise RuntimeError(f"Controller alarm: {response}")
+            elif response:
+                print(response, file=log)
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["lines_per_second"] = stats["lines"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["mean_in_flight"] = occupancy / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+def send_file(gcode_path, device, baudrate=BAUD_RATE, compact=True, wake_timeout=WAKE_TIMEOUT,
+              **stream_options):
+    """Wake the controller on device and stream a .gcode file to it; returns stream_gcode()'s stats"""
+    port = open_port(device, baudrate)
+    try:
+        wake_controller(port, wake_timeout, log=stream_options.get("log", sys.stdout))
+        return stream_gcode(port, program_lines(gcode_path, compact), **stream_options)
+    finally:
+        port.close()
+
+# -------------------------------
+# SIMULATED CONTROLLER
+# -------------------------------
+_WORD = re.compile(r"([A-Z])([-+]?(?:\d+\.?\d*|\.\d+))")
+
+class SimulatedController:
+    """A grbl-like controller on a pty, for testing senders without hardware.
+
+    Bytes arrive at baudrate into an RX buffer of rx_size; bytes past it
+    are dropped, as on the real controller. Each complete line is parsed
+    and acknowledged with "ok" once the planner has room for it, so a full
+    planner backs up the RX buffer. Motion blocks run one after another at
+    constant speed (acceleration is not modelled; job_stats estimates
+    that), speedup times faster than real time. A "?" is answered on
+    receipt with a status report (Run or Idle, and the free planner
+    blocks and RX bytes). A stall is time the machine stood still between
+    two motion blocks, waiting for the next.
+
+    Like grbl reset by its port opening, it greets the sender with BANNER
+    (when its first bytes arrive: a pty gives no sign of being opened),
+    and it answers blank lines with "ok", so senders must sync up before
+    streaming.
+    """
+
+    BANNER = b"\r\nGrbl 1.1h ['$' for help]\r\n"
+
+    def __init__(self, rx_size=RX_BUFFER_SIZE, planner_blocks=PLANNER_BLOCKS, baudrate=BAUD_RATE,
+                 feed=FEED_RATE, rapid_rate=RAPID_RATE, speedup=1.0):
+        self.rx_size = rx_size
+        self.planner_blocks = planner_blocks
+        self.byte_time = 10.0 / baudrate / speedup   # 8N1: ten bits a byte
+        self.rapid_rate = rapid_rate
+        self.speedup = speedup
+        self.device = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Modal state
+        self.position = [0.0, 0.0, 0.0]
+        self.motion = 0
+        self.feed = feed
+
+    def start(self):
+        """Open the pty and run the controller; returns the device to send to"""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.device
+
+    def stop(self):
+        """Finish the planned motion, stop, and return the stats"""
+        self._stop.set()
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+        return self.stats
+
+    def _block_time(self, line):
+        """Machine seconds of a parsed line, 0 if it does not move; None if invalid"""
+        words = _WORD.findall(line)
+        if "".join(letter + value for letter, value in words) != line:
+            return None
+        words = [(letter, float(value)) for letter, value in words]
+        for letter, value in words:
+            if letter == "G" and value in (0, 1, 2, 3):
+                self.motion = int(value)
+            elif letter == "F":
+                self.feed = value
+        values = dict(words)
+        start = list(self.position)
+        end = [values.get(axis, p) for axis, p in zip("XYZ", start)]
+        self.position = end
+        if not any(axis in values for axis in "XYZ"):
+            return 0.0
+        dx, dy, dz = (e - s for e, s in zip(end, start))
+        length = math.sqrt(dx * dx + dy * dy + dz * dz)
+        if self.motion in (2, 3):
+            i, j = values.get("I", 0.0), values.get("J", 0.0)
+            cx, cy = start[0] + i, start[1] + j
+            a0 = math.atan2(start[1] - cy, start[0] - cx)
+            a1 = math.atan2(end[1] - cy, end[0] - cx)
+            sweep = (a0 - a1 if self.motion == 2 else a1 - a0) % (2 * math.pi) or 2 * math.pi
+            length = math.hypot(math.hypot(i, j) * sweep, dz)
+        rate = self.rapid_rate if self.motion == 0 else self.feed
+        return 60.0 * length / rate
+
+    def _run(self):
+        clock = time.perf_counter
+        wire = collections.deque()        # (arrival time, bytes) still on the line
+        rx = b""
+        planner = collections.deque()     # End times of planned blocks
+        busy_until = None                 # End of the last planned block
+        arrival = 0.0
+        stats = {"lines": 0, "motion_blocks": 0, "errors": 0, "dropped_bytes": 0,
+                 "motion_seconds": 0.0, "stall_seconds": 0.0, "max_rx": 0, "max_planner": 0}
+        rx_area = planner_area = 0.0
+        first = last = None
+        greeted = False
+
+        while not (self._stop.is_set() and not wire and (busy_until is None or busy_until <= clock())):
+            now = clock()
+            if first is not None:
+                rx_area += len(rx) * (now - last)
+                planner_area += len(planner) * (now - last)
+                last = now
+            while planner and planner[0] <= now:
+                planner.popleft()
+
+            # Bytes that have come off the wire
+            while wire and wire[0][0] <= now:
+                rx += wire.popleft()[1]
+                if len(rx) > self.rx_size:
+                    stats["dropped_bytes"] += len(rx) - self.rx_size
+                    rx = rx[:self.rx_size]
+            stats["max_rx"] = max(stats["max_rx"], len(rx))
+
+            # Parse complete lines while the planner has room
+            responses = []
+            while b"\n" in rx and len(planner) < self.planner_blocks:
+                line, rx = rx.split(b"\n", 1)
+                line = _SPACE.sub(b"", line).decode(errors="replace").upper()
+                if not line:
+                    # grbl acknowledges blank lines, for syncing
+                    responses.append(b"ok\r\n")
+                    continue
+                stats["lines"] += 1
+                seconds = self._block_time(line)
+                if seconds is None:
+                    stats["errors"] += 1
+                    responses.append(b"error:1\r\n")
+                    continue
+                if seconds > 0:
+                    start = now if busy_until is None else max(now, busy_until)
+                    if busy_until is not None:
+                        stats["stall_seconds"] += (start - busy_until) * self.speedup
+                    busy_until = start + seconds / self.speedup
+                    planner.append(busy_until)
+                    stats["motion_blocks"] += 1
+                    stats["motion_seconds"] += seconds
+                responses.append(b"ok\r\n")
+            if responses:
+                os.write(self._master, b"".join(responses))
+            stats["max_planner"] = max(stats["max_planner"], len(planner))
+
+            # Sleep until the next byte, block end or input
+            wakes = [wire[0][0]] if wire else []
+            if planner:
+                wakes.append(planner[0])
+            timeout = min([0.05] + [max(0.0, t - clock()) for t in wakes])
+            ready, _, _ = select.select([self._master], [], [], timeout)
+            if ready:
+                data = os.read(self._master, READ_SIZE)
+                now = clock()
+                if not greeted:
+                    os.write(self._master, self.BANNER)
+                    greeted = True
+                if b"?" in data:
+                    # Real-time status query: answered on receipt, never buffered
+                    data = data.replace(b"?", b"")
+                    state = "Run" if busy_until is not None and busy_until > now else "Idle"
+                    free = f"{self.planner_blocks - len(planner)},{self.rx_size - len(rx)}"
+                    os.write(self._master, f"<{state}|Bf:{free}>\r\n".encode())
+                if data:
+                    if first is None:
+                        first = last = now
+                    arrival = max(arrival, now) + len(data) * self.byte_time
+                    wire.append((arrival, data))
+
+        elapsed = (last - first) if first is not None else 0.0
+        stats["mean_rx"] = rx_area / elapsed if elapsed else 0.0
+        stats["mean_planner"] = planner_area / elapsed if elapsed else 0.0
+        self.stats = stats
+
+def format_stream_stats(stream, controller=None):
+    """Human-readable report of stream_gcode() and, optionally, controller stats"""
+    lines = [
+        f"Sent: {stream['lines']} lines, {stream['bytes']} bytes in {stream['seconds']:.2f} s "
+        f"({stream['lines_per_second']:.0f} lines/s)",
+        f"RX buffer in flight: mean {stream['mean_in_flight']:.0f}, max {stream['max_in_flight']} bytes; "
+        f"blocked {stream['blocked_seconds']:.2f} s",
+        f"Errors: {len(stream['errors'])}",
+    ]
+    if controller is not None:
+        lines += [
+            f"Controller: {controller['motion_blocks']} motion blocks, "
+            f"{controller['motion_seconds']:.1f} s of motion, stalled {controller['stall_seconds']:.1f} s",
+            f"Controller RX: mean {controller['mean_rx']:.0f}, max {controller['max_rx']} bytes, "
+            f"dropped {controller['dropped_bytes']}; planner: mean {controller['mean_planner']:.1f}, "
+            f"max {controller['max_planner']} blocks",
+        ]
+    return "\n".join(lines)
+
+# -------------------------------
+# COMMAND LINE
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream G-code to a grbl-style controller.")
+    parser.add_argument("gcode", help=".gcode file to send")
+    parser.add_argument("device", nargs="?", help="serial device or pty of the controller")
+    parser.add_argument("--baud", type=int, default=BAUD_RATE, help="serial baud rate")
+    parser.add_argument("--rx-size", type=int, default=RX_BUFFER_SIZE, help="controller RX buffer (bytes)")
+    parser.add_argument("--ping-pong", action="store_true", help="wait for each response before sending")
+    parser.add_argument("--timeout", type=float, default=RESPONSE_TIMEOUT,
+                        help="seconds the controller may stay silent, or idle with lines unanswered")
+    parser.add_argument("--keep-spaces", action="store_true", help="send lines with their whitespace")
+    parser.add_argument("--simulate", action="store_true", help="send to a simulated controller")
+    parser.add_argument("--speedup", type=float, default=1.0, help="simulated controller time factor")
+    args = parser.parse_args(argv)
+    if not args.simulate and args.device is None:
+        parser.error("a device is required unless --simulate is given")
+
+    controller = None
+    device = args.device
+    if args.simulate:
+        controller = SimulatedController(rx_size=args.rx_size, baudrate=args.baud, speedup=args.speedup)
+        device = controller.start()
+    try:
+        stream = send_file(args.gcode, device, args.baud, compact=not args.keep_spaces,
+                           rx_size=args.rx_size, ping_pong=args.ping_pong, timeout=args.timeout)
+    finally:
+        controller_stats = controller.stop() if controller is not None else None
+    print(format_stream_stats(stream, controller_stats))
+    return 1 if stream["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# stage_cache.py
+# Content-addressed on-disk cache for the stages of the scan -> G-code pipeline.
+# A stage's key hashes its input (file bytes or the key of the stage before
+# it) with its own parameters, so changing a parameter only misses the
+# stages downstream of it. Least recently used entries go past max_bytes.
+# Requirements: pip install numpy
+
+import hashlib
+import os
+import pickle
+import numpy as np
+
+from atomic_file import replacing
+
+CACHE_DIR = ".kolam_cache"
+CACHE_BYTES = 1 << 30    # Size bound of the cache directory (bytes)
+READ_CHUNK = 1 << 20     # Bytes hashed per read of an input file
+
+# -------------------------------
+# KEYS
+# -------------------------------
+def digest(*parts):
+    """SHA-256 hex digest of a sequence of bytes, arrays and plain values"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(f"{part.dtype}{part.shape}".encode())
+            part = np.ascontiguousarray(part).data
+        elif not isinstance(part, (bytes, bytearray, memoryview)):
+            part = repr(part).encode()
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's contents"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+# -------------------------------
+# CACHE
+# -------------------------------
+class StageCache:
+    """Pickled stage results in a directory, one file per key.
+
+    A hit refreshes the entry's modification time; a store evicts the
+    entries touched longest ago until the directory fits in max_bytes.
+    Entries are written beside and renamed, so worker processes can share
+    a directory.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage, *parts):
+        """Key of a stage from its inputs and parameters"""
+        return f"{stage}-{digest(stage, *parts)}"
+
+    def file_key(self, path):
+        return digest(file_digest(path))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        """Stored value of key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        with replacing(self._path(key), "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.evict()
+
+    def stage(self, stage, parts, compute):
+        """(key, value) of a stage: the stored value, or compute() stored on a miss"""
+        key = self.key(stage, *parts)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return key, value
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+class _NoCache:
+    """StageCache interface that stores nothing: every stage is computed"""
+
+    def key(self, stage, *parts):
+        return None
+
+    def file_key(self, path):
+        return None
+
+    def stage(self, stage, parts, compute):
+        return None, compute()
+
+NO_CACHE = _NoCache()
@@ -0,0 +1,151 @@
+# svg_reader.py
+# Streaming SVG reader for the files img.py writes: <polyline>, <polygon>,
+# <line>, <circle> and straight-edged <path> elements become NumPy vertex
+# arrays instead of one svgpathtools Line per vertex pair. Curved paths,
+# ellipses and rects still go through svgpathtools
+# Requirements: pip install numpy svgpathtools
+
+import re
+import xml.etree.ElementTree as ET
+import numpy as np
+from svgpathtools import parse_path
+from svgpathtools.svg_to_paths import ellipse2pathd, polyline2pathd, rect2pathd
+
+from sampling import arc_parameters
+
+# svg2paths() lists shapes grouped by element, in this order
+ELEMENT_ORDER = ("path", "polyline", "polygon", "line", "ellipse", "circle", "rect")
+
+# -------------------------------
+# SHAPES
+# -------------------------------
+class Polyline:
+    """A straight-edged shape as an (N,2) array of its vertices.
+
+    Straight segments need no subdivision, so sample() returns the vertices
+    whatever the step count or chord tolerance.
+    """
+
+    def __init__(self, points):
+        self.points = points
+
+    def __len__(self):
+        return max(len(self.points) - 1, 0)
+
+    def sample(self, steps=80, chord_tolerance=None):
+        return self.points if len(self.points) > 1 else np.empty((0, 2))
+
+class Circle:
+    """A circle sampled the way svgpathtools draws it: two half arcs from its left"""
+
+    def __init__(self, cx, cy, r):
+        self.cx, self.cy, self.r = cx, cy, r
+
+    def __len__(self):
+        return 2
+
+    def _half(self, t, theta):
+        angle = np.radians(theta + t * -180.0)
+        return np.column_stack((self.r * np.cos(angle) + self.cx, self.r * np.sin(angle) + self.cy))
+
+    def sample(self, steps=80, chord_tolerance=None):
+        if chord_tolerance is None:
+            t = np.arange(steps + 1) / steps
+            return np.vstack((self._half(t, 180.0), self._half(t, 0.0)))
+        # The second half starts on the end of the first, which is not repeated
+        t = arc_parameters(self.r, 180.0, chord_tolerance)
+        return np.vstack((self._half(t, 180.0), self._half(t[1:], 0.0)))
+
+# -------------------------------
+# ELEMENTS
+# -------------------------------
+_PATH_TOKEN = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+def _coordinates(text):
+    """(N,2) array of a points attribute, or None if it needs svgpathtools"""
+    try:
+        values = np.array(text.replace(",", " ").split(), dtype=float)
+    except ValueError:   # e.g. "10-5", a sign as the separator
+        return None
+    return values[:len(values) // 2 * 2].reshape(-1, 2)
+
+def _straight_path(d):
+    """Vertices of a single subpath of M/L/H/V/Z commands, or None for anything else"""
+    tokens = _PATH_TOKEN.findall(d)
+    if not tokens or tokens[0] not in "Mm":
+        return None
+    points = []
+    x = y = 0.0
+    command = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            if token in "Zz":
+                if i != len(tokens) - 1:
+                    return None
+                if points and points[-1] != points[0]:
+                    points.append(points[0])
+                break
+            if token not in "MmLlHhVv" or (token in "Mm" and points):
+                return None
+            command = token
+            i += 1
+            continue
+        relative = command.islower()
+        try:
+            if command in "MmLl":
+                dx, dy = float(token), float(tokens[i + 1])
+                i += 2
+                x, y = (x + dx, y + dy) if relative else (dx, dy)
+                # Pairs after a moveto are implicit linetos
+                command = "l" if relative else "L"
+            elif command in "Hh":
+                x = x + float(token) if relative else float(token)
+                i += 1
+            else:
+                y = y + float(token) if relative else float(token)
+                i += 1
+        except (IndexError, ValueError):
+            return None
+        points.append((x, y))
+    return np.array(points, dtype=float).reshape(-1, 2)
+
+def _shape(tag, attributes):
+    """Shape of one element: a Polyline, a Circle or an svgpathtools Path"""
+    if tag == "circle":
+        return Circle(float(attributes.get("cx", 0)), float(attributes.get("cy", 0)),
+                      float(attributes["r"]))
+    if tag == "line":
+        return Polyline(np.array([[float(attributes.get(k, 0)) for k in ("x1", "y1")],
+                                  [float(attributes.get(k, 0)) for k in ("x2", "y2")]]))
+    if tag in ("polyline", "polygon"):
+        points = _coordinates(attributes.get("points", ""))
+        if points is None:
+            return parse_path(polyline2pathd(attributes, tag == "polygon"))
+        if tag == "polygon" and len(points):
+            # svgpathtools closes a polygon with a line back to its first
+            # vertex, even if the last vertex is already there
+            points = np.vstack((points, points[:1]))
+        return Polyline(points)
+    if tag == "path":
+        points = _straight_path(attributes["d"])
+        return Polyline(points) if points is not None else parse_path(attributes["d"])
+    if tag == "ellipse":
+        return parse_path(ellipse2pathd(attributes))
+    return parse_path(rect2pathd(attributes))
+
+def read_svg(svg_path):
+    """Shapes of an SVG, in the order svg2paths() lists them.
+
+    The file is parsed incrementally and each element is dropped once read,
+    so memory follows the number of points rather than the document. The
+    shapes work with sampling.PathSampler.
+    """
+    groups = {tag: [] for tag in ELEMENT_ORDER}
+    for _, element in ET.iterparse(svg_path, events=("end",)):
+        tag = element.tag.rpartition("}")[2]
+        if tag in groups:
+            groups[tag].append(_shape(tag, element.attrib))
+        element.clear()
+    return [shape for tag in ELEMENT_ORDER for shape in groups[tag]]
@@ -0,0 +1,42 @@
+# test_atomic_file.py
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from atomic_file import replacing
+from gcode_writer import write_gcode
+
+def test_concurrent_writers_leave_one_complete_file(tmp_path):
+    target = tmp_path / "out.gcode"
+    paths = [[np.array([[i, 0.0], [i, 10.0]]) for i in range(200)],
+             [np.array([[0.0, i], [10.0, i]]) for i in range(300)]]
+    expected = []
+    for toolpaths in paths:
+        write_gcode(toolpaths, target)
+        expected.append(target.read_text())
+    barrier = threading.Barrier(8)
+
+    def writer(toolpaths):
+        barrier.wait()
+        for _ in range(5):
+            write_gcode(toolpaths, target)
+
+    threads = [threading.Thread(target=writer, args=(paths[i % 2],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert target.read_text() in expected
+    assert os.listdir(tmp_path) == ["out.gcode"]
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    target = tmp_path / "out.gcode"
+    target.write_text("old\n")
+    with pytest.raises(RuntimeError):
+        with replacing(target) as f:
+            f.write("new\n")
+            raise RuntimeError
+    assert target.read_text() == "old\n"
+    assert os.listdir(tmp_path) == ["out.gcode"]
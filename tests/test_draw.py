@@ -0,0 +1,28 @@
+# test_draw.py
+import os
+
+import pytest
+
+pytest.importorskip("tkinter")
+import draw
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg">'
+       '<path d="M 0 0 C 10 20 30 20 40 0"/><circle cx="50" cy="50" r="10"/></svg>')
+
+class Cancel(Exception):
+    pass
+
+@pytest.mark.parametrize("stop_at", [0.7, 0.8, 0.95])
+def test_cancelled_conversion_stops_before_the_next_stage(tmp_path, stop_at):
+    svg = tmp_path / "in.svg"
+    svg.write_text(SVG)
+    gcode = tmp_path / "out.gcode"
+
+    def progress(fraction):
+        if fraction >= stop_at:
+            raise Cancel()
+
+    with pytest.raises(Cancel):
+        draw.svg_to_gcode(str(svg), str(gcode), progress=progress)
+    assert os.path.exists(gcode) == (stop_at > 0.8)
+    assert not os.path.exists(str(gcode)[:-len(".gcode")] + ".ktp")
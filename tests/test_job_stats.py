@@ -0,0 +1,13 @@
+# test_job_stats.py
+import pytest
+
+from gcode_parser import parse_gcode
+from job_stats import job_stats
+
+def test_rapid_z_retract_runs_at_rapid_rate():
+    program = parse_gcode("G1 Z-2 F500\nG0 Z5\n")
+    stats = job_stats(program, plunge_rate=200, rapid_rate=3000, acceleration=1e9)
+    # 7 mm at 3000 mm/min, not held to the 200 mm/min plunge rate
+    assert stats["rapid_time"] == pytest.approx(7 / 50.0, rel=1e-3)
+    # The feed plunge still is
+    assert stats["cycle_time"] - stats["rapid_time"] == pytest.approx(7 / (200 / 60.0), rel=1e-3)
@@ -0,0 +1,11 @@
+# test_sampling.py
+import numpy as np
+from svgpathtools import CubicBezier
+
+from sampling import sample_path_adaptive
+
+def test_curve_doubling_back_along_its_chord_is_split():
+    # Runs from 0 out to x=23.75 and back to 10, all on the chord's line
+    points = sample_path_adaptive([CubicBezier(0, 30, 30, 10)], 0.05)
+    assert np.isclose(points[:, 0].max(), 23.75)
+    assert np.allclose(points[[0, -1]], [[0, 0], [10, 0]])
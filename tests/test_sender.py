@@ -0,0 +1,43 @@
+# test_sender.py
+import io
+
+import pytest
+
+pytest.importorskip("termios")
+from sender import SimulatedController, open_port, send_file, wake_controller
+
+PROGRAM = """G21
+G90
+G0 Z5
+G0 X10 Y10
+G1 Z-2 F200
+G1 X20 Y10 F500
+G2 X30 Y10 I5 J0
+G0 Z5
+M30
+"""
+
+def test_wake_reads_the_banner_and_discards_the_oks():
+    controller = SimulatedController(speedup=100)
+    port = open_port(controller.start())
+    try:
+        log = io.StringIO()
+        assert wake_controller(port, log=log) == "Grbl 1.1h ['$' for help]"
+        assert "Grbl 1.1h" in log.getvalue()
+        # The "ok"s to the blank wake-up lines are gone
+        assert port.read(0.2) == b""
+    finally:
+        port.close()
+        controller.stop()
+
+def test_send_file_streams_after_waking_the_controller(tmp_path):
+    path = tmp_path / "job.gcode"
+    path.write_text(PROGRAM)
+    controller = SimulatedController(speedup=100)
+    device = controller.start()
+    try:
+        stream = send_file(str(path), device, timeout=5.0, log=io.StringIO())
+    finally:
+        stats = controller.stop()
+    assert stream["lines"] == stats["lines"] == 9
+    assert stream["errors"] == [] and stats["errors"] == 0
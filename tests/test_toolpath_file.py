@@ -0,0 +1,46 @@
+# test_toolpath_file.py
+import os
+
+import numpy as np
+
+from gcode_parser import load_gcode
+from gcode_writer import write_gcode
+from toolpath import fit_arcs
+from toolpath_file import load_toolpaths, toolpath_path, write_toolpaths
+
+def _toolpaths():
+    t = np.linspace(0, 2 * np.pi, 400)
+    circles = [np.column_stack((20 * k + 8 * np.cos(t), 8 * np.sin(t))) for k in range(10)]
+    rng = np.random.default_rng(0)
+    zigzags = [np.cumsum(rng.uniform(-3, 3, (500, 2)), axis=0) for _ in range(10)]
+    return [fit_arcs(points) for points in circles] + zigzags
+
+def test_toolpath_file_is_smaller_than_its_gcode(tmp_path):
+    gcode = str(tmp_path / "job.gcode")
+    toolpaths = _toolpaths()
+    write_gcode(toolpaths, gcode)
+    write_toolpaths(gcode, toolpaths)
+    assert os.path.getsize(toolpath_path(gcode)) < os.path.getsize(gcode)
+
+def test_toolpath_file_loads_the_program_of_its_gcode(tmp_path):
+    gcode = str(tmp_path / "job.gcode")
+    toolpaths = _toolpaths()
+    write_gcode(toolpaths, gcode)
+    write_toolpaths(gcode, toolpaths)
+    parsed, loaded = load_gcode(gcode), load_toolpaths(gcode)
+    assert loaded is not None
+    assert loaded.code_names == parsed.code_names
+    assert np.array_equal(loaded.codes, parsed.codes)
+    assert np.array_equal(loaded.lineno, parsed.lineno)
+    assert sorted(loaded.words) == sorted(parsed.words)
+    for letter, column in parsed.words.items():
+        assert np.allclose(loaded.words[letter], column, atol=1e-4, equal_nan=True)
+    assert loaded.raw_text() == parsed.raw_text()
+
+def test_toolpath_file_is_ignored_once_its_gcode_changes(tmp_path):
+    gcode = str(tmp_path / "job.gcode")
+    toolpaths = _toolpaths()
+    write_gcode(toolpaths, gcode)
+    write_toolpaths(gcode, toolpaths)
+    write_gcode(toolpaths[:3], gcode)
+    assert load_toolpaths(gcode) is None
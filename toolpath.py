@@ -0,0 +1,375 @@
+# toolpath.py
+# Post-processing stages for discretized toolpaths: each path is an (N,2) array
+# Requirements: pip install numpy scipy
+
+from collections import defaultdict, deque
+import numpy as np
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# -------------------------------
+# PATH CHAINING
+# -------------------------------
+def _grid_cell(point, cell):
+    return (int(np.floor(point[0] / cell)), int(np.floor(point[1] / cell)))
+
+def chain_paths(paths, tolerance=0.1):
+    """Join paths whose endpoints meet within tolerance into longer paths.
+
+    Endpoints are bucketed on a grid of tolerance-sized cells, so each join
+    only inspects the 3x3 cells around the current chain end. Paths are
+    reversed as needed; the joining point of the appended path is dropped.
+    Chains are grown forwards from their end, then backwards from their
+    start. Empty paths are dropped.
+    """
+    paths = [np.asarray(p, dtype=float) for p in paths if len(p)]
+    endpoints = np.empty((2 * len(paths), 2))
+    grid = defaultdict(list)
+    for i, p in enumerate(paths):
+        endpoints[2 * i], endpoints[2 * i + 1] = p[0], p[-1]
+        grid[_grid_cell(p[0], tolerance)].append(2 * i)
+        grid[_grid_cell(p[-1], tolerance)].append(2 * i + 1)
+    used = np.zeros(len(paths), dtype=bool)
+
+    def take_nearest(point):
+        """Claim the unused endpoint nearest to point, if within tolerance"""
+        best, best_dist = None, tolerance
+        cx, cy = _grid_cell(point, tolerance)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for endpoint in grid.get((cx + dx, cy + dy), ()):
+                    if used[endpoint // 2]:
+                        continue
+                    dist = np.hypot(*(endpoints[endpoint] - point))
+                    if dist <= best_dist:
+                        best, best_dist = endpoint, dist
+        if best is not None:
+            used[best // 2] = True
+        return best
+
+    chains = []
+    for i, path in enumerate(paths):
+        if used[i]:
+            continue
+        used[i] = True
+        pieces = deque([path])
+        end = path[-1]
+        while (endpoint := take_nearest(end)) is not None:
+            piece = paths[endpoint // 2]
+            piece = piece[::-1] if endpoint % 2 else piece
+            pieces.append(piece[1:])
+            end = piece[-1]
+        start = path[0]
+        while (endpoint := take_nearest(start)) is not None:
+            piece = paths[endpoint // 2]
+            piece = piece if endpoint % 2 else piece[::-1]
+            pieces.appendleft(piece[:-1])
+            start = piece[0]
+        chains.append(np.concatenate(pieces) if len(pieces) > 1 else path)
+    return chains
+
+# -------------------------------
+# PATH ORDERING
+# -------------------------------
+def rapid_distance(paths, origin=(0.0, 0.0)):
+    """Total length of the travel moves from origin through paths in order"""
+    paths = [p for p in paths if len(p)]
+    if not paths:
+        return 0.0
+    starts = np.array([p[0] for p in paths], dtype=float)
+    ends = np.vstack(([origin], [p[-1] for p in paths[:-1]])).astype(float)
+    return float(np.linalg.norm(starts - ends, axis=1).sum())
+
+class _EndpointIndex:
+    """Nearest-unvisited lookup over path endpoints.
+
+    Endpoint 2*i is the start of path i and 2*i+1 its end. The KD-tree cannot
+    drop visited points, so it is rebuilt over the remaining endpoints once
+    half of the indexed ones have been used.
+    """
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        self.visited = np.zeros(len(endpoints) // 2, dtype=bool)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.ids = np.flatnonzero(~np.repeat(self.visited, 2))
+        self.live = len(self.ids)
+        if cKDTree is not None:
+            self.tree = cKDTree(self.endpoints[self.ids])
+
+    def visit(self, path_index):
+        self.visited[path_index] = True
+        self.live -= 2
+        if self.live and self.live * 2 < len(self.ids):
+            self._rebuild()
+
+    def nearest(self, point):
+        """Endpoint id of the unvisited endpoint nearest to point"""
+        if cKDTree is None:
+            ids = self.ids[~self.visited[self.ids // 2]]
+            dist = np.linalg.norm(self.endpoints[ids] - point, axis=1)
+            return ids[np.argmin(dist)]
+        k = 8
+        while True:
+            k = min(k, len(self.ids))
+            _, found = self.tree.query(point, k=k)
+            ids = self.ids[np.atleast_1d(found)]
+            free = ids[~self.visited[ids // 2]]
+            if len(free):
+                return free[0]
+            k *= 4
+
+def _two_opt(starts, ends, origin, window, max_passes):
+    """Improve a path sequence by reversing runs of it in place.
+
+    Reversing the run i..j flips each path in it, so only the two rapids at
+    the run's boundaries change length. Candidate runs are limited to window
+    paths to keep a pass linear in the number of paths.
+    """
+    n = len(starts)
+    order = np.arange(n)
+    flipped = np.zeros(n, dtype=bool)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 1):
+            prev_end = ends[order[i - 1]] if i else origin
+            first_start = starts[order[i]]
+            js = np.arange(i + 1, min(n, i + window))
+            run_end = ends[order[js]]
+            next_start = starts[order[np.minimum(js + 1, n - 1)]]
+            # The last path has no successor, so no outgoing rapid
+            has_next = js + 1 < n
+            old = (np.linalg.norm(first_start - prev_end)
+                   + np.where(has_next, np.linalg.norm(next_start - run_end, axis=1), 0.0))
+            new = (np.linalg.norm(run_end - prev_end, axis=1)
+                   + np.where(has_next, np.linalg.norm(next_start - first_start, axis=1), 0.0))
+            gain = old - new
+            best = np.argmax(gain)
+            if gain[best] > 1e-9:
+                run = order[i:js[best] + 1][::-1].copy()
+                order[i:js[best] + 1] = run
+                flipped[run] = ~flipped[run]
+                # Every path in the run now enters at its old end
+                starts[run], ends[run] = ends[run].copy(), starts[run].copy()
+                improved = True
+        if not improved:
+            break
+    return order, flipped
+
+def order_paths(paths, origin=(0.0, 0.0), two_opt=True, window=50, max_passes=3):
+    """Reorder paths, reversing some, to shorten the rapid moves between them.
+
+    Paths are chained greedily to the nearest unvisited endpoint, entering a
+    path from its far end when that is closer. With two_opt the sequence is
+    then refined by reversing runs of up to window paths. Empty paths are
+    dropped.
+    """
+    paths = [np.asarray(p, dtype=float) for p in paths if len(p)]
+    if len(paths) < 2:
+        return paths
+    endpoints = np.empty((2 * len(paths), 2))
+    endpoints[0::2] = [p[0] for p in paths]
+    endpoints[1::2] = [p[-1] for p in paths]
+
+    index = _EndpointIndex(endpoints)
+    position = np.asarray(origin, dtype=float)
+    ordered = []
+    for _ in range(len(paths)):
+        endpoint = index.nearest(position)
+        path_index, at_end = divmod(endpoint, 2)
+        index.visit(path_index)
+        path = paths[path_index][::-1] if at_end else paths[path_index]
+        ordered.append(path)
+        position = path[-1]
+
+    if two_opt:
+        starts = np.array([p[0] for p in ordered])
+        ends = np.array([p[-1] for p in ordered])
+        order, flipped = _two_opt(starts, ends, np.asarray(origin, dtype=float), window, max_passes)
+        ordered = [ordered[k][::-1] if flipped[k] else ordered[k] for k in order]
+    return ordered
+
+# -------------------------------
+# SIMPLIFICATION AND ARC FITTING
+# -------------------------------
+LINE, ARC_CW, ARC_CCW = 1, 2, 3   # G-code motion numbers
+
+class ArcPath:
+    """A toolpath made of line and arc moves.
+
+    points holds the move endpoints, starting with the path start. Row k of
+    moves describes the move from points[k] to points[k+1]: its G code
+    (LINE, ARC_CW or ARC_CCW) and, for arcs, the I/J offset of the centre
+    from points[k].
+    """
+
+    def __init__(self, points, moves):
+        self.points = points
+        self.moves = moves
+
+    def __len__(self):
+        return len(self.points)
+
+def _segment_distance(points, a, b):
+    """Distance of each point to the segment a-b"""
+    ab = b - a
+    length_sq = ab @ ab
+    if length_sq == 0:
+        return np.linalg.norm(points - a, axis=1)
+    t = np.clip((points - a) @ ab / length_sq, 0.0, 1.0)
+    return np.linalg.norm(points - (a + t[:, None] * ab), axis=1)
+
+def simplify_polyline(points, tolerance):
+    """Indices of the points Douglas-Peucker keeps within tolerance"""
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dist = _segment_distance(points[first + 1:last], points[first], points[last])
+        worst = int(np.argmax(dist))
+        if dist[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+def _circle_through(a, b, c):
+    """Centre of the circle through three points, or None if collinear"""
+    d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+    if abs(d) < 1e-12:
+        return None
+    sa, sb, sc = a @ a, b @ b, c @ c
+    return np.array([
+        (sa * (b[1] - c[1]) + sb * (c[1] - a[1]) + sc * (a[1] - b[1])) / d,
+        (sa * (c[0] - b[0]) + sb * (a[0] - c[0]) + sc * (b[0] - a[0])) / d,
+    ])
+
+def _fit_arc(points, tolerance, max_radius, max_bulge):
+    """Centre and G code of an arc following all points within tolerance, or None"""
+    a, b, c = points[0], points[len(points) // 2], points[-1]
+    centre = _circle_through(a, b, c)
+    if centre is None:
+        return None
+    offsets = points - centre
+    radius = np.linalg.norm(a - centre)
+    if radius > max_radius:
+        return None
+    if np.max(np.abs(np.linalg.norm(offsets, axis=1) - radius)) > tolerance:
+        return None
+    # Points must sweep monotonically around the centre, short of a full turn,
+    # and the arc may not bulge away from any chord between them
+    turns = np.diff(np.unwrap(np.arctan2(offsets[:, 1], offsets[:, 0])))
+    if not (np.all(turns > 0) or np.all(turns < 0)):
+        return None
+    if abs(turns.sum()) > 1.9 * np.pi:
+        return None
+    if radius * (1 - np.cos(np.max(np.abs(turns)) / 2)) > max_bulge:
+        return None
+    return centre, (ARC_CCW if turns[0] > 0 else ARC_CW)
+
+def fit_arcs(points, tolerance=0.02, chord_tolerance=0.0, min_points=5, max_radius=1000.0):
+    """Replace a polyline with G2/G3 arcs and simplified G1 lines.
+
+    Arcs are grown greedily from each point, galloping then bisecting to the
+    longest run of at least min_points that stays within tolerance of one
+    circle. The stretches between arcs are simplified with Douglas-Peucker.
+    Points are first rounded to the 0.01 mm output grid so every arc starts
+    and ends exactly on the coordinates written.
+
+    chord_tolerance is how far the polyline's chords may already sit inside
+    the curve they were sampled from; an arc may bulge out from a chord by
+    that much on top of tolerance.
+    """
+    max_bulge = tolerance + chord_tolerance
+    points = np.round(np.asarray(points, dtype=float), 2)
+    n = len(points)
+    keep = [0]
+    moves = []
+
+    def flush_lines(first, last):
+        kept = first + simplify_polyline(points[first:last + 1], tolerance)
+        keep.extend(kept[1:])
+        moves.extend([(LINE, 0.0, 0.0)] * (len(kept) - 1))
+
+    line_start = i = 0
+    while i < n - 1:
+        fit = None
+        end = i + min_points - 1
+        if end < n:
+            fit = _fit_arc(points[i:end + 1], tolerance, max_radius, max_bulge)
+        if fit is None:
+            i += 1
+            continue
+        step = min_points
+        bad = n
+        while end + step < n:
+            candidate = _fit_arc(points[i:end + step + 1], tolerance, max_radius, max_bulge)
+            if candidate is None:
+                bad = end + step
+                break
+            end, fit = end + step, candidate
+            step *= 2
+        lo, hi = end, bad
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            candidate = _fit_arc(points[i:mid + 1], tolerance, max_radius, max_bulge)
+            if candidate is None:
+                hi = mid
+            else:
+                lo, fit = mid, candidate
+        end = lo
+        if np.max(_segment_distance(points[i:end + 1], points[i], points[end])) <= tolerance:
+            i += 1  # straight enough to be left to the line simplification
+            continue
+        flush_lines(line_start, i)
+        centre, code = fit
+        keep.append(end)
+        moves.append((code, *(centre - points[i])))
+        line_start = i = end
+    flush_lines(line_start, n - 1)
+    return ArcPath(points[keep], np.array(moves, dtype=float).reshape(-1, 3))
+
+# -------------------------------
+# MOVE STATISTICS
+# -------------------------------
+def move_count(path):
+    """Number of cutting moves in a plain or arc-fitted path"""
+    if isinstance(path, ArcPath):
+        return len(path.moves)
+    return max(0, len(path) - 1)
+
+def estimate_cut_time(paths, feed=500, min_block_time=0.01):
+    """Rough cutting time in seconds.
+
+    Each move takes its length at feed (mm/min), but never less than
+    min_block_time: short blocks drain the controller's planner faster than
+    it can plan them, so the machine never reaches feed on them.
+    """
+    total = 0.0
+    for path in paths:
+        if isinstance(path, ArcPath):
+            starts, ends = path.points[:-1], path.points[1:]
+            lengths = np.linalg.norm(ends - starts, axis=1)
+            arcs = path.moves[:, 0] != LINE
+            if arcs.any():
+                radius = np.linalg.norm(path.moves[arcs, 1:], axis=1)
+                centre = starts[arcs] + path.moves[arcs, 1:]
+                a0 = np.arctan2(*(starts[arcs] - centre).T[::-1])
+                a1 = np.arctan2(*(ends[arcs] - centre).T[::-1])
+                sweep = np.where(path.moves[arcs, 0] == ARC_CCW, a1 - a0, a0 - a1) % (2 * np.pi)
+                lengths[arcs] = radius * sweep
+        else:
+            lengths = np.linalg.norm(np.diff(np.asarray(path, dtype=float), axis=0), axis=1)
+        total += np.maximum(lengths / feed * 60.0, min_block_time).sum()
+    return float(total)
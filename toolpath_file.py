@@ -0,0 +1,265 @@
+# toolpath_file.py
+# Binary companion of a .gcode file: the toolpaths it was written from as
+# packed, memory-mappable arrays (float32 XY per move, a move code, arc
+# centres and per-path offsets), plus a JSON header with the program's
+# constant Z and feed settings, bounds and stats, so a job opens without
+# re-parsing its text
+# Requirements: pip install numpy
+
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+from atomic_file import replacing
+from gcode_parser import GCodeProgram, duplicate_moves, parse_gcode
+from gcode_writer import (CUT_DEPTH, FEED_RATE, PLUNGE_RATE, PROGRAM_FOOTER, PROGRAM_HEADER,
+                          SAFE_HEIGHT)
+from job_stats import job_stats
+
+SUFFIX = ".ktp"
+MAGIC = b"KTPF"
+VERSION = 2
+ALIGN = 64              # Byte alignment of every array in the file
+_PREAMBLE = struct.Struct("<4sII")   # magic, version, header length
+
+# Move codes: the rapid to the start of a path, then its cut moves
+RAPID, LINE, CLOCKWISE, COUNTERCLOCKWISE = 0, 1, 2, 3
+
+def _aligned(size):
+    return -(-size // ALIGN) * ALIGN
+
+def toolpath_path(gcode_path):
+    """Path of the binary companion of a .gcode file"""
+    return os.path.splitext(gcode_path)[0] + SUFFIX
+
+class ToolpathProgram(GCodeProgram):
+    """A GCodeProgram rebuilt from a toolpath file.
+
+    xy, moves and path_offsets are read-only views of the mapped file:
+    the point of every move, its move code and where each path's points
+    start (with the total at the end). header holds the writer's options,
+    the bounds and the job_stats() of the program. Raw text comes from the
+    mapped .gcode.
+    """
+
+    def __init__(self, header, xy, moves, path_offsets, **columns):
+        super().__init__(**columns)
+        self.header = header
+        self.xy = xy
+        self.moves = moves
+        self.path_offsets = path_offsets
+
+# -------------------------------
+# COMMANDS
+# -------------------------------
+def _fixed_lines(lines):
+    """Code names and words of lines the writer emits verbatim"""
+    program = parse_gcode("".join(line + "\n" for line in lines))
+    return [program.code(i) for i in range(len(program))], program.words
+
+def _commands(xy, moves, path_offsets, ij, options):
+    """Codes, code names, words and line numbers of the program write_gcode() emits, and its line count.
+
+    One command per line, laid out as gcode_writer.path_gcode() writes
+    them, with the G0/G1 moves that parse_gcode() drops dropped here too.
+    """
+    counts = np.diff(path_offsets)
+    head_names, head_words = _fixed_lines(PROGRAM_HEADER)
+    foot_names, foot_words = _fixed_lines(PROGRAM_FOOTER)
+    # Each path is a lift, a rapid, a plunge, its cut moves and a retract
+    path_line = len(head_names) + np.concatenate(([0], np.cumsum(counts + 3)))
+    total = path_line[-1] + len(foot_names)
+    path_line = path_line[:-1]
+
+    names = ["G0", "G1", "G2", "G3"] + head_names + foot_names
+    codes = np.zeros(total, dtype=np.int32)
+    words = {letter: np.full(total, np.nan) for letter in "XYZFIJ"}
+
+    def fixed(start, local, fixed_names, fixed_words):
+        rows = start + np.arange(len(fixed_names))
+        codes[rows] = local + np.arange(len(fixed_names))
+        for letter, column in fixed_words.items():
+            words.setdefault(letter, np.full(total, np.nan))[rows] = column
+
+    fixed(0, 4, head_names, head_words)
+    fixed(total - len(foot_names), 4 + len(head_names), foot_names, foot_words)
+
+    # Lift, plunge and retract, with the values as their text reads back
+    lift, plunge, retract = path_line, path_line + 2, path_line + counts + 2
+    codes[plunge] = 1
+    words["Z"][lift] = words["Z"][retract] = float(str(options["safe_height"]))
+    words["Z"][plunge] = float(f"{options['depth']:.2f}")
+    words["F"][plunge] = float(options["plunge_rate"])
+
+    # The rapid to each path's start, then its cut moves
+    path = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(len(moves)) - path_offsets[:-1][path]
+    rows = path_line[path] + 1 + step + (step > 0)
+    codes[rows] = moves
+    words["X"][rows], words["Y"][rows] = xy[:, 0], xy[:, 1]
+    words["F"][rows[step > 0]] = float(options["feed"])
+    arcs = rows[moves >= CLOCKWISE]
+    words["I"][arcs], words["J"][arcs] = ij[:, 0], ij[:, 1]
+
+    # The names that occur, sorted, as parse_gcode() gives them
+    used = np.unique(codes)
+    code_names, remap = np.unique(np.array(names)[used], return_inverse=True)
+    lookup = np.zeros(len(names), dtype=np.int32)
+    lookup[used] = remap.ravel()
+    code_names = tuple(str(name) for name in code_names)
+    codes = lookup[codes]
+    words = {letter: column for letter, column in words.items() if not np.isnan(column).all()}
+    kept = ~duplicate_moves(codes, code_names, words)
+    return (codes[kept], code_names, {k: v[kept] for k, v in words.items()},
+            np.flatnonzero(kept), int(total))
+
+# -------------------------------
+# WRITING
+# -------------------------------
+def _packed(toolpaths):
+    """Points, move codes, path offsets and arc centres of fitted toolpaths.
+
+    Values are rounded as the G-code writes them, so the file reads back
+    the positions the machine sees.
+    """
+    points, moves, ij, counts = [], [], [], []
+    for path in toolpaths:
+        path_moves = getattr(path, "moves", None)
+        path_points = np.asarray(getattr(path, "points", path), dtype=float).reshape(-1, 2)
+        if len(path_points) == 0:
+            continue
+        codes = np.full(len(path_points), LINE, dtype=np.uint8)
+        codes[0] = RAPID
+        if path_moves is not None and len(path_moves):
+            codes[1:] = path_moves[:, 0]
+            ij.append(path_moves[path_moves[:, 0] >= CLOCKWISE, 1:])
+        points.append(path_points)
+        moves.append(codes)
+        counts.append(len(path_points))
+    xy = np.round(np.concatenate(points), 2) if points else np.empty((0, 2))
+    ij = np.round(np.concatenate(ij), 4) if ij else np.empty((0, 2))
+    return {
+        "xy": xy.astype(np.float32),
+        "moves": np.concatenate(moves) if moves else np.empty(0, dtype=np.uint8),
+        "path_offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.uint32),
+        "ij": ij.astype(np.float32),
+    }
+
+def _stats_header(stats):
+    header = {k: v for k, v in stats.items() if k != "histogram"}
+    if stats["histogram"] is not None:
+        counts, edges = stats["histogram"]
+        header["histogram"] = {"counts": counts.tolist(), "edges": edges.tolist()}
+    return header
+
+def write_toolpaths(gcode_path, toolpaths, depth=CUT_DEPTH, feed=FEED_RATE,
+                    safe_height=SAFE_HEIGHT, plunge_rate=PLUNGE_RATE,
+                    start=(0.0, 0.0, SAFE_HEIGHT)):
+    """Write the binary companion of a .gcode file; returns its path.
+
+    toolpaths and the path options are the ones gcode_writer.write_gcode()
+    just wrote gcode_path from; nothing is read back from the text. The
+    file records the .gcode's size and modification time, and is ignored
+    by load_toolpaths() once either changes.
+    """
+    arrays = _packed(toolpaths)
+    options = {"depth": depth, "feed": feed, "safe_height": safe_height, "plunge_rate": plunge_rate}
+    codes, code_names, words, lineno, lines = _commands(
+        arrays["xy"].astype(float), arrays["moves"], arrays["path_offsets"].astype(np.int64),
+        arrays["ij"].astype(float), options)
+    empty = np.zeros(len(codes), dtype=np.int64)
+    stats = job_stats(GCodeProgram(b"", codes, code_names, words, lineno, empty, empty), start=start)
+
+    gcode_stat = os.stat(gcode_path)
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [offset, array.dtype.str, list(array.shape)]
+        offset += _aligned(array.nbytes)
+    header = json.dumps({
+        "commands": len(codes),
+        "lines": lines,
+        "paths": len(arrays["path_offsets"]) - 1,
+        "options": options,
+        "start": list(start),
+        "gcode": {"size": gcode_stat.st_size, "mtime_ns": gcode_stat.st_mtime_ns},
+        "bounds": stats["bounds"],
+        "cut_bounds": stats["cut_bounds"],
+        "stats": _stats_header(stats),
+        "arrays": layout,
+    }).encode()
+    data_start = _aligned(_PREAMBLE.size + len(header))
+
+    path = toolpath_path(gcode_path)
+    with replacing(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][0])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    return path
+
+# -------------------------------
+# READING
+# -------------------------------
+def _map(path):
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return b""
+
+def load_toolpaths(gcode_path):
+    """Memory-map the binary companion of a .gcode file as a ToolpathProgram.
+
+    Returns None if there is none, or it was written by another version
+    or for another state of the .gcode; the caller then parses the text.
+    Raises ValueError if the file is damaged. The .gcode stays mapped for
+    raw text, which is safe because gcode_writer replaces files instead of
+    rewriting them in place; finding its lines is one scan for newlines.
+    """
+    path = toolpath_path(gcode_path)
+    if not os.path.exists(path) or not os.path.exists(gcode_path):
+        return None
+    data = _map(path)
+    if len(data) < _PREAMBLE.size:
+        raise ValueError(f"Truncated toolpath file: {path}")
+    magic, version, header_size = _PREAMBLE.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a toolpath file: {path}")
+    if version != VERSION:
+        return None
+    header = json.loads(bytes(data[_PREAMBLE.size:_PREAMBLE.size + header_size]))
+    gcode_stat = os.stat(gcode_path)
+    try:
+        if header["gcode"] != {"size": gcode_stat.st_size, "mtime_ns": gcode_stat.st_mtime_ns}:
+            return None
+        data_start = _aligned(_PREAMBLE.size + header_size)
+        arrays = {}
+        for name, (offset, dtype, shape) in header["arrays"].items():
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)),
+                                         offset=data_start + offset).reshape(shape)
+        codes, code_names, words, lineno, lines = _commands(
+            arrays["xy"].astype(float), arrays["moves"], arrays["path_offsets"].astype(np.int64),
+            arrays["ij"].astype(float), header["options"])
+        buffer = _map(gcode_path)
+        text = np.frombuffer(buffer, dtype=np.uint8)
+        newlines = np.flatnonzero(text == 10)
+        if lines != header["lines"] or len(newlines) != lines:
+            raise ValueError(f"Toolpath file does not match its G-code: {path}")
+        raw_end = newlines[lineno]
+        raw_end -= text[np.maximum(raw_end - 1, 0)] == 13   # "\r\n" line ends
+        return ToolpathProgram(
+            header, arrays["xy"], arrays["moves"], arrays["path_offsets"],
+            buffer=buffer,
+            codes=codes,
+            code_names=code_names,
+            words=words,
+            lineno=lineno,
+            raw_start=np.concatenate(([0], newlines + 1))[lineno],
+            raw_end=raw_end,
+        )
+    except (KeyError, TypeError, IndexError) as e:
+        raise ValueError(f"Malformed toolpath file: {path}") from e